@@ -1,7 +1,12 @@
-import streamlit as st, pandas as pd, numpy as np, plotly.express as px, unicodedata, re
-from app_utils import get_logo_bytes, get_geojson, build_interventions
+import streamlit as st, pandas as pd, plotly.express as px
+from app_utils import cached, get_logo_bytes, get_base_map, get_commune_map, get_commune_table, get_index, get_interventions, get_rows, get_selection_cube, get_result_cache, get_store, date_bounds, export_button, memory_report, missing_communes, paged_table, profiler
+from engine import resample_counts, summarize
+from maps import choropleth, commune_counts
+from store import scope_of
+from ingest import combine, dataset_key, load_snapshot, parse_workbook, parse_workbooks, save_snapshot, snapshot_key
 
 st.set_page_config(page_title="Interventions Enedis", layout="wide", initial_sidebar_state="expanded")
+prof = profiler("app")
 
 enedis_cols = ["#2C75FF", "#75C700", "#4A9BFF", "#A0D87C", "#0072F0", "#47B361", "#6EABFF", "#9EE08E"]
 
@@ -11,9 +16,6 @@ if logo_bytes:
 else:
     st.warning("Logo manquant")
 
-def _n(x):
-    return ''.join(c for c in unicodedata.normalize('NFKD', str(x)) if not unicodedata.combining(c)).lower().replace(' ', '').replace('_', '')
-
 if hasattr(st, "cache_data"):
     cache_decorator = st.cache_data
 else:  # pragma: no cover - fallback for older streamlit versions
@@ -21,89 +23,105 @@ else:  # pragma: no cover - fallback for older streamlit versions
 
 
 @cache_decorator
-def _load(upload):
-    def _p(df):
-        df.columns = df.columns.str.strip()
-        m = {_n(c): c for c in df.columns}
-        d = m.get('datederealisation')
-        c = m.get('commune')
-        if d is None or c is None:
-            return None
-
-        ap = m.get('agentprogramme')
-        ag = m.get('agent')
-        if ap and 'Agent' not in df.columns:
-            df.rename(columns={ap: 'Agent'}, inplace=True)
-        elif ag and 'Agent' not in df.columns:
-            df.rename(columns={ag: 'Agent'}, inplace=True)
-
-        rt = m.get('tempsrealise')
-        tt = m.get('tempstheorique')
-        if rt:
-            df.rename(columns={rt: 'Temps réalisé'}, inplace=True)
-            df['Temps réalisé'] = pd.to_numeric(df['Temps réalisé'], errors='coerce')
-        if tt:
-            df.rename(columns={tt: 'Temps théorique'}, inplace=True)
-            df['Temps théorique'] = pd.to_numeric(df['Temps théorique'], errors='coerce')
-
-        pg = m.get('perimetregeographique')
-        if pg :
-            df['Agence'] = (
-                df[pg]
-                .astype(str)
-                .str.extract(r'AISMA\s+\d+_(.+)', expand=False)
-                .str.replace('_', ' ', regex=False)
-                .str.title()
-            )
-
-        df[d] = pd.to_datetime(df[d], errors='coerce')
-        df = df.dropna(subset=[d])
-        df['Année'] = df[d].dt.year
-        df['Mois'] = df[d].dt.month
-        df['Jour'] = df[d].dt.day
-        df['Mois_nom'] = df[d].dt.strftime('%b')
-        df['Arr'] = df[c].astype(str).str.extract(r'PARIS\s*(\d{1,2})')[0].astype(float).astype('Int64')
-        return df
-
-    for s in (2, 1, 0):
+def _load(keys, _uploads):
+    frames, todo = {}, {}
+    for key, upload in zip(keys, _uploads):
+        snap = load_snapshot(key)
+        if snap is None:
+            todo[key] = upload
+        else:
+            frames[key] = snap
+
+    if todo:
+        bar = st.progress(0.0, text="Lecture des fichiers…")
         try:
-            upload.seek(0)
-            raw = pd.read_excel(upload, skiprows=s, engine='openpyxl').dropna(how='all')
-        except:
-            continue
-        o = _p(raw)
-        if o is not None:
-            return o
-    return None
-
-
-upl = st.sidebar.file_uploader("Fichier Excel", type=["xlsx"])
-if upl is None:
+            if len(todo) == 1:
+                (key, upload), = todo.items()
+                upload.seek(0)
+                frames[key] = parse_workbook(upload, progress=lambda f: bar.progress(f, text="Lecture du fichier…"))
+            else:
+                data = {key: upload.getvalue() for key, upload in todo.items()}
+                for i, (key, o) in enumerate(parse_workbooks(data)):
+                    frames[key] = o
+                    bar.progress((i + 1) / len(data), text="Lecture des fichiers…")
+        finally:
+            bar.empty()
+        for key in todo:
+            if frames.get(key) is not None:
+                save_snapshot(key, frames[key])
+            elif len(keys) > 1:
+                st.warning(f"Fichier non conforme : {getattr(todo[key], 'name', key)}")
+
+    parts = [frames[k] for k in keys if frames.get(k) is not None]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else combine(parts)
+
+
+@cached
+def _summary(interventions: pd.DataFrame, cube: dict, params: tuple, keys: tuple) -> dict:
+    """Return the *keys* summaries of the filtered dataset, see :func:`engine.summarize`.
+
+    They are read from the precomputed store when it holds the selection.
+    """
+    start, end, selection = params
+    store = get_store(st.session_state["data_key"])
+    if store is not None:
+        scope = scope_of(get_index(st.session_state["data_key"], st.session_state["data"]), selection, start, end)
+        bundle = store.summary(*scope) if scope else None
+        if bundle is not None:
+            return {k: v for k, v in bundle.items() if k in keys}
+    return summarize(interventions, cube, keys)
+
+
+upl = st.sidebar.file_uploader("Fichiers Excel", type=["xlsx"], accept_multiple_files=True)
+if not upl:
     st.stop()
 
-if "data" in st.session_state and st.session_state.get("upload_name") == getattr(upl, "name", None):
+names = tuple(getattr(u, "name", None) for u in upl)
+if "data" in st.session_state and st.session_state.get("upload_name") == names:
     df = st.session_state["data"]
 else:
-    df = _load(upl)
+    keys = tuple(snapshot_key(u.getvalue()) for u in upl)
+    df = _load(keys, upl)
     if df is None or df.empty:
         st.error("Fichier non conforme")
         st.stop()
     st.session_state["data"] = df
-    st.session_state["upload_name"] = getattr(upl, "name", None)
+    st.session_state["data_key"] = dataset_key(keys)
+    st.session_state["upload_name"] = names
+    st.session_state.pop("filtres_ok", None)
+prof.lap("Chargement")
+
+mem = memory_report(st.session_state["data_key"], df)
+with st.sidebar.expander(f"Mémoire : {mem['Mo'].sum():.1f} Mo"):
+    st.dataframe(mem, hide_index=True)
+    cs = get_result_cache().stats()
+    st.caption(
+        f"Cache des calculs : {cs['entries']} entrées, {cs['bytes'] / 2**20:.1f} Mo, "
+        f"{cs['hits']} succès / {cs['misses']} échecs ({cs['hit_rate']:.0%}), {cs['evictions']} évictions"
+    )
+prof.lap("Mémoire")
+
+index = get_index(st.session_state["data_key"], df)
 
-years = sorted(df["Année"].unique())
+years = index.values("Année")
 months = list(range(1, 13))
 days = list(range(1, 32))
-agents = sorted(df["Agent"].dropna().unique()) if "Agent" in df.columns else []
-agences = sorted(df["Agence"].dropna().unique()) if "Agence" in df.columns else []
+agents = index.values("Agent")
+agences = index.values("Agence")
 default_agents = ["CICIO Florin","DJABELKHIR Mohammed","MAILLARD Yoann","RONCERAY Florian","PEINADO BENITO Augustin","DANSOKO Toumany","GRANDEMANGE Gary","PAYET Vincent","VAUSSOUE Jean-françois","MARC Radjoucoumar","KONE Gaoussou","TRINH Quang","ABRANTES FELIZARDO Artur","KESSI Farid","TRARI Nasr eddine","CASTELLI Stéfano","DIANIFABA Ibrahima","AHAMADA Nazir","BOUJATLA Samir","MUZAMA NDANGU Landry","BROUILLARD Geoffroy","DJABRI Gabrielle","EXILUS Marc","KONGA Chris","SANTAT Eric","LAPITRE Jean-philippe","LARNICOL Lucas","DJABELKHIR Mohamed","DAAOU Yassine","DALAOUI Jeber","LOUBAKI CYS Francel","VACQUER Andre"]
 default_agents_in_data = [a for a in default_agents if a in agents] or agents
-prestations = sorted(df["Prestation"].dropna().unique()) if "Prestation" in df.columns else []
-uos = sorted(df["Code et libelle Uo"].dropna().unique()) if "Code et libelle Uo" in df.columns else []
-statuts = sorted(df["Statut de l'intervention"].dropna().unique()) if "Statut de l'intervention" in df.columns else []
-etats = sorted(df["Etat de réalisation"].dropna().unique()) if "Etat de réalisation" in df.columns else []
+prestations = index.values("Prestation")
+uos = index.values("Code et libelle Uo")
+statuts = index.values("Statut de l'intervention")
+etats = index.values("Etat de réalisation")
+
+period = index.date_range
+prof.lap("Index")
 
 with st.sidebar.form("filtres"):
+    per = st.date_input("Période", value=period, min_value=period[0], max_value=period[1])
     y = st.multiselect("Années", years, years)
     m = st.multiselect("Mois", months, months, format_func=lambda x: f"{x:02d}")
     d = st.multiselect("Jours", days, days, format_func=lambda x: f"{x:02d}")
@@ -114,49 +132,60 @@ with st.sidebar.form("filtres"):
     st_sel = st.multiselect("Statut", statuts, statuts)
     et_sel = st.multiselect("État", etats, etats)
     ok = st.form_submit_button("Appliquer")
+prof.lap("Barre latérale")
 
 
-if not ok:
+# Les filtres restent appliqués quand un onglet ou un tableau relance la page.
+if ok:
+    st.session_state["filtres_ok"] = True
+if not st.session_state.get("filtres_ok"):
     st.stop()
 
-msk = df["Année"].isin(y) & df["Mois"].isin(m) & df["Jour"].isin(d)
-if set(ag_sel) != set(agents):
-    msk &= df["Agent"].isin(ag_sel)
-if set(agc_sel) != set(agences):
-    msk &= df["Agence"].isin(agc_sel)
-if prestations:
-    msk &= df["Prestation"].isin(pr)
-if uos:
-    msk &= df["Code et libelle Uo"].isin(uo_sel)
-if statuts:
-    msk &= df["Statut de l'intervention"].isin(st_sel)
-if etats:
-    msk &= df["Etat de réalisation"].isin(et_sel)
-
-flt = df[msk]
-if flt.empty:
+start, end = date_bounds(per)
+selection = {
+    "Année": y,
+    "Mois": m,
+    "Jour": d,
+    "Agent": ag_sel if set(ag_sel) != set(agents) else None,
+    "Agence": agc_sel if set(agc_sel) != set(agences) else None,
+    "Prestation": pr if prestations else None,
+    "Code et libelle Uo": uo_sel if uos else None,
+    "Statut de l'intervention": st_sel if statuts else None,
+    "Etat de réalisation": et_sel if etats else None,
+}
+
+# Lignes, interventions et cube sont mis en cache par état des filtres : changer
+# d'onglet ne refait que le contenu de l'onglet ouvert.
+params = (start, end, selection)
+if not len(get_rows(df, params)):
     st.warning("Aucune donnée")
     st.stop()
+prof.lap("Filtres")
 
-interventions = build_interventions(flt)
+interventions = get_interventions(df, params)
+prof.lap("build_interventions")
 if interventions.empty:
     st.warning("Aucune intervention selon les critères définis.")
     st.stop()
 
+cube = get_selection_cube(interventions, params)
+kpi = _summary(interventions, cube, params, ("metrics",))["metrics"]
+prof.lap("Cube et indicateurs")
+
 def pct(s):
     return (s / s.sum() * 100).round(1)
 
 c1, c2, c3, c4, c5, c6 = st.columns(6)
 
-c1.metric("Nombre d’interventions", len(interventions))
+c1.metric("Nombre d’interventions", kpi["n"])
 
 if {"Temps réalisé", "Temps théorique"}.issubset(interventions.columns):
-    réalisé_moy = interventions["Temps réalisé"].mean()
-    théorique_moy = interventions["Temps théorique"].mean()
-    réalisé_max = interventions["Temps réalisé"].max()
-    réalisé_min = interventions["Temps réalisé"].min()
-    ecart_moyen = (interventions["Temps réalisé"] - interventions["Temps théorique"]).mean()
-    taux_depassement = (interventions["Temps réalisé"] > interventions["Temps théorique"]).mean() * 100
+    réalisé_moy = kpi["realise_moy"]
+    théorique_moy = kpi["theorique_moy"]
+    réalisé_max = kpi["realise_max"]
+    réalisé_min = kpi["realise_min"]
+    ecart_moyen = kpi["ecart_moy"]
+    taux_depassement = kpi["taux_depassement"]
 
     c2.metric("Réalisé moyen (min)", f"{réalisé_moy:.1f}")
     c3.metric("Théorique moyen (min)", f"{théorique_moy:.1f}")
@@ -166,149 +195,164 @@ if {"Temps réalisé", "Temps théorique"}.issubset(interventions.columns):
 
     st.caption(f"💡 {taux_depassement:.1f}% des interventions ont dépassé la durée théorique.")
 else:
-    réalisé_moy = interventions["Temps réalisé"].mean()
-    réalisé_max = interventions["Temps réalisé"].max()
-    réalisé_min = interventions["Temps réalisé"].min()
+    réalisé_moy = kpi["realise_moy"]
+    réalisé_max = kpi["realise_max"]
+    réalisé_min = kpi["realise_min"]
 
     c2.metric("Durée moyenne", f"{réalisé_moy:.1f} min")
     c3.metric("Durée max", f"{réalisé_max:.1f} min")
     c4.metric("Durée min", f"{réalisé_min:.1f} min")
 
-va = interventions["Année"].value_counts().sort_index().reset_index()
-va.columns = ["Année", "n"]
-f = px.bar(
-    va,
-    x="Année",
-    y="n",
-    color="Année",
-    color_discrete_sequence=enedis_cols,
-    title="Volume annuel",
+# Chaque onglet ne calcule ses agrégats et ses graphiques que lorsqu'il est ouvert.
+tab_volumes, tab_repartitions, tab_top, tab_cartes, tab_donnees = st.tabs(
+    ["Volumes", "Répartitions", "Top 10", "Cartes", "Données"], key="onglet", on_change="rerun"
 )
-f.update_traces(text=va["n"], textposition="outside", hovertemplate="Année %{x}<br>%{y} interventions")
-st.plotly_chart(f, use_container_width=True)
-
-
-vm = interventions.groupby(["Année", "Mois_nom"]).size().reset_index(name="n")
-st.plotly_chart(px.bar(vm, x="Mois_nom", y="n", color="Année", color_discrete_sequence=enedis_cols, barmode="group", title="Volume mensuel"), use_container_width=True)
-
-if "Prestation" in interventions.columns:
-    st.plotly_chart(px.pie(interventions, names="Prestation", color_discrete_sequence=enedis_cols, title="Répartition prestations"), use_container_width=True)
-
-if {"Statut de l'intervention", "Etat de réalisation"}.issubset(interventions.columns):
-    a, b = st.columns(2)
-    a.plotly_chart(px.pie(interventions, names="Statut de l'intervention", color_discrete_sequence=enedis_cols, title="Statut"), use_container_width=True)
-    b.plotly_chart(px.pie(interventions, names="Etat de réalisation", color_discrete_sequence=enedis_cols, title="État de réalisation"), use_container_width=True)
-
-if "Libelle du BI" in interventions.columns:
-    t = interventions["Libelle du BI"].value_counts().nlargest(10).reset_index()
-    t.columns = ["lbl", "n"]
-    t["pct"] = pct(t["n"])
-    f = px.bar(t, x="lbl", y="n", text="pct", color="lbl", color_discrete_sequence=enedis_cols, title="Top 10 Libellé BI")
-    f.update_traces(hovertemplate="%{x}<br>%{text}%")
-    st.plotly_chart(f, use_container_width=True)
-
-if "Code et libelle Uo" in interventions.columns:
-    u = interventions["Code et libelle Uo"].value_counts().nlargest(10).reset_index()
-    u.columns = ["uo", "n"]
-    u["pct"] = pct(u["n"])
-    f = px.bar(u, x="uo", y="n", text="pct", color="uo", color_discrete_sequence=enedis_cols, title="Top 10 UO")
-    f.update_traces(hovertemplate="%{x}<br>%{text}%")
-    st.plotly_chart(f, use_container_width=True)
-
-
-
-if "PRM" in interventions.columns:
-    interventions = interventions.copy()
-    interventions["PRM_clean"] = interventions["PRM"].dropna().apply(lambda x: str(x).split('.')[0])
-    top_prm = interventions["PRM_clean"].value_counts().nlargest(10).reset_index()
-    top_prm.columns = ["PRM", "n"]
-    top_prm["Rang"] = [f"{i+1}ᵉ" for i in range(len(top_prm))]
-
-    f = px.bar(
-        top_prm,
-        x="Rang",
-        y="n",
-        color="PRM",
-        color_discrete_sequence=enedis_cols,
-        text="n",
-        title="Top 10 PRM (classés)"
-    )
-    f.update_traces(textposition="outside", hovertemplate="Rang %{x}<br>%{y} interventions<br>PRM %{customdata}")
-    f.update_layout(xaxis_title="Rang", yaxis_title="Nombre d’interventions")
-    st.plotly_chart(f, use_container_width=True)
-
-
-cols_order = [
-    "PRM", "Prestation", "Perimètre géographique", "Libelle du BI", "Commune",
-    "Code et libelle Uo", "Origine", "Date de programmation", "Date de réalisation",
-    "Statut de l'intervention", "Etat de réalisation", "Motif de non réalisation",
-    "Temps théorique", "Temps réalisé", "Agent", "CDT", "Commentaire du technicien"
-]
-
-# Affichage du tableau des lignes concernées
-if "PRM_clean" in interventions.columns:
-    top_10_prm = top_prm["PRM"].tolist()
-    top_prm_df = interventions[interventions["PRM_clean"].isin(top_10_prm)]
-
-    st.subheader("📋 Détails des interventions des 10 PRM les plus sollicités")
-    st.dataframe(top_prm_df[[c for c in cols_order if c in top_prm_df.columns]])
-
-
-
-if "Origine" in interventions.columns:
-    t = interventions["Origine"].value_counts().reset_index()
-    t.columns = ["Origine", "n"]
-    t["pct"] = pct(t["n"])
-    f = px.bar(t, x="Origine", y="n", text="pct", color="Origine", color_discrete_sequence=enedis_cols, title="Répartition par Origine")
-    f.update_traces(hovertemplate="%{x}<br>%{text}%")
-    st.plotly_chart(f, use_container_width=True)
-
-if "Date de programmation" in interventions.columns:
-    try:
-        interventions = interventions.copy()
-        interventions["Date de programmation"] = pd.to_datetime(interventions["Date de programmation"], errors='coerce')
-        t = interventions["Date de programmation"].dt.date.value_counts().sort_index().reset_index()
-        t.columns = ["Date", "n"]
-        f = px.bar(t, x="Date", y="n", color_discrete_sequence=enedis_cols, title="Volume des programmations par jour")
-        st.plotly_chart(f, use_container_width=True)
-    except:
-        pass
-
-if "Motif de non réalisation" in interventions.columns:
-    t = interventions["Motif de non réalisation"].dropna().value_counts().nlargest(10).reset_index()
-    t.columns = ["Motif", "n"]
-    t["pct"] = pct(t["n"])
-    f = px.bar(t, x="Motif", y="n", text="pct", color="Motif", color_discrete_sequence=enedis_cols, title="Top 10 Motifs de non réalisation")
-    f.update_traces(hovertemplate="%{x}<br>%{text}%")
-    st.plotly_chart(f, use_container_width=True)
-
-
-
-
-if {"Temps théorique", "Temps réalisé", "Prestation"}.issubset(interventions.columns):
-    t = interventions.groupby("Prestation")[["Temps théorique", "Temps réalisé"]].mean().reset_index()
-    f = px.bar(t, x="Prestation", y=["Temps théorique", "Temps réalisé"], color_discrete_sequence=enedis_cols[:2], barmode="group", title="Temps théorique vs réalisé par prestation")
-    st.plotly_chart(f, use_container_width=True)
-
-gj = get_geojson()
-if "Arr" in interventions.columns and gj:
-    arr = interventions["Arr"].value_counts().rename_axis("Arr").reset_index(name="n")
-    arr["Arr"] = arr["Arr"].astype(int)
-    arr["pct"] = pct(arr["n"])
-    f = px.choropleth(
-    arr,
-    geojson=gj,
-    locations="Arr",
-    color="pct",
-    color_continuous_scale=[[0, "#E6F0FF"], [1, "#2C75FF"]],
-    featureidkey="properties.c_ar",  # ← gardé une seule fois
-    hover_data={"pct":":.1f"},
-    center={"lat": 48.8566, "lon": 2.3522},
-    title="Interventions par arrondissement")
-    f.update_geos(fitbounds="locations", visible=False)
-    f.update_traces(hovertemplate="Arr %{location}<br>%{customdata[0]}%")
-    st.plotly_chart(f, use_container_width=True)
-
-cols_order = ["PRM", "Prestation", "Perimètre géographique", "Libelle du BI", "Commune", "Code et libelle Uo", "Origine", "Date de programmation", "Date de réalisation", "Statut de l'intervention", "Etat de réalisation", "Motif de non réalisation", "Temps théorique", "Temps réalisé", "Agent", "CDT", "Commentaire du technicien"]
-st.dataframe(interventions[[c for c in cols_order if c in interventions.columns]])
 
+if tab_volumes.open:
+    with tab_volumes:
+        bundle = _summary(interventions, cube, params, ("annual", "monthly", "programmation"))
+        prof.lap("Agrégats Volumes")
+        va = bundle["annual"]
+        f = px.bar(
+            va,
+            x="Année",
+            y="n",
+            color="Année",
+            color_discrete_sequence=enedis_cols,
+            title="Volume annuel",
+        )
+        f.update_traces(text=va["n"], textposition="outside", hovertemplate="Année %{x}<br>%{y} interventions")
+        st.plotly_chart(f, use_container_width=True)
+        prof.lap("Volume annuel")
+
+        vm = bundle["monthly"]
+        st.plotly_chart(px.bar(vm, x="Mois_nom", y="n", color="Année", color_discrete_sequence=enedis_cols, barmode="group", title="Volume mensuel"), use_container_width=True)
+        prof.lap("Volume mensuel")
+
+        if "programmation" in bundle:
+            try:
+                t, unit = resample_counts(bundle["programmation"])
+                f = px.bar(t, x="Date", y="n", color_discrete_sequence=enedis_cols, title=f"Volume des programmations par {unit}")
+                st.plotly_chart(f, use_container_width=True)
+                prof.lap("Programmations")
+            except:
+                pass
+
+if tab_repartitions.open:
+    with tab_repartitions:
+        bundle = _summary(interventions, cube, params, ("prestation", "statut", "etat", "origine", "motif"))
+        prof.lap("Agrégats Répartitions")
+        if "prestation" in bundle:
+            st.plotly_chart(px.pie(bundle["prestation"], names="Prestation", values="n", color_discrete_sequence=enedis_cols, title="Répartition prestations"), use_container_width=True)
+            prof.lap("Répartition prestations")
+
+        if {"statut", "etat"}.issubset(bundle):
+            a, b = st.columns(2)
+            a.plotly_chart(px.pie(bundle["statut"], names="Statut de l'intervention", values="n", color_discrete_sequence=enedis_cols, title="Statut"), use_container_width=True)
+            b.plotly_chart(px.pie(bundle["etat"], names="Etat de réalisation", values="n", color_discrete_sequence=enedis_cols, title="État de réalisation"), use_container_width=True)
+            prof.lap("Statut et état")
+
+        if "origine" in bundle:
+            t = bundle["origine"][["Origine", "n"]]
+            t.columns = ["Origine", "n"]
+            t["pct"] = pct(t["n"])
+            f = px.bar(t, x="Origine", y="n", text="pct", color="Origine", color_discrete_sequence=enedis_cols, title="Répartition par Origine")
+            f.update_traces(hovertemplate="%{x}<br>%{text}%")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Origine")
+
+        if "motif" in bundle:
+            t = bundle["motif"].head(10)[["Motif de non réalisation", "n"]]
+            t.columns = ["Motif", "n"]
+            t["pct"] = pct(t["n"])
+            f = px.bar(t, x="Motif", y="n", text="pct", color="Motif", color_discrete_sequence=enedis_cols, title="Top 10 Motifs de non réalisation")
+            f.update_traces(hovertemplate="%{x}<br>%{text}%")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Motifs")
+
+        if "prestation" in bundle and {"Temps théorique", "Temps réalisé"}.issubset(bundle["prestation"].columns):
+            t = bundle["prestation"].sort_values("Prestation")[["Prestation", "Temps théorique", "Temps réalisé"]]
+            f = px.bar(t, x="Prestation", y=["Temps théorique", "Temps réalisé"], color_discrete_sequence=enedis_cols[:2], barmode="group", title="Temps théorique vs réalisé par prestation")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Temps par prestation")
+
+if tab_top.open:
+    with tab_top:
+        bundle = _summary(interventions, cube, params, ("bi", "uo", "prm"))
+        prof.lap("Agrégats Top 10")
+        if "bi" in bundle:
+            t = bundle["bi"].head(10)[["Libelle du BI", "n"]].reset_index(drop=True)
+            t.columns = ["lbl", "n"]
+            t["pct"] = pct(t["n"])
+            f = px.bar(t, x="lbl", y="n", text="pct", color="lbl", color_discrete_sequence=enedis_cols, title="Top 10 Libellé BI")
+            f.update_traces(hovertemplate="%{x}<br>%{text}%")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Top 10 BI")
+
+        if "uo" in bundle:
+            u = bundle["uo"].head(10)[["Code et libelle Uo", "n"]]
+            u.columns = ["uo", "n"]
+            u["pct"] = pct(u["n"])
+            f = px.bar(u, x="uo", y="n", text="pct", color="uo", color_discrete_sequence=enedis_cols, title="Top 10 UO")
+            f.update_traces(hovertemplate="%{x}<br>%{text}%")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Top 10 UO")
+
+        if "prm" in bundle:
+            top_prm = bundle["prm"].head(10).reset_index(drop=True)
+            top_prm.columns = ["PRM", "n"]
+            top_prm["Rang"] = [f"{i+1}ᵉ" for i in range(len(top_prm))]
+
+            f = px.bar(
+                top_prm,
+                x="Rang",
+                y="n",
+                color="PRM",
+                color_discrete_sequence=enedis_cols,
+                text="n",
+                title="Top 10 PRM (classés)"
+            )
+            f.update_traces(textposition="outside", hovertemplate="Rang %{x}<br>%{y} interventions<br>PRM %{customdata}")
+            f.update_layout(xaxis_title="Rang", yaxis_title="Nombre d’interventions")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Top 10 PRM")
+
+            # Affichage du tableau des lignes concernées
+            top_10_prm = top_prm["PRM"].tolist()
+            top_prm_df = interventions[interventions["PRM_clean"].isin(top_10_prm)]
+
+            st.subheader("📋 Détails des interventions des 10 PRM les plus sollicités")
+            paged_table(top_prm_df, key="top_prm")
+            export_button(top_prm_df, name="interventions_top_prm", key="export_top_prm")
+            prof.lap("Tableau top PRM")
+
+if tab_cartes.open:
+    with tab_cartes:
+        bundle = _summary(interventions, cube, params, ("arr", "commune"))
+        prof.lap("Agrégats Cartes")
+        base_map = get_base_map()
+        if "arr" in bundle and base_map:
+            arr = bundle["arr"][["Arr", "n"]]
+            arr["Arr"] = arr["Arr"].astype(int)
+            arr["pct"] = pct(arr["n"])
+            f = choropleth(base_map, arr["Arr"], arr["pct"], hovertemplate="Arr %{location}<br>%{z:.1f}%", title="Interventions par arrondissement")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Carte arrondissements")
+
+        commune_map = get_commune_map()
+        if "commune" in bundle and commune_map:
+            com, hors_zone = commune_counts(bundle["commune"].set_index("Commune")["n"], get_commune_table())
+            com["pct"] = pct(com["n"])
+            f = choropleth(commune_map, com["code"], com["pct"], com[["nom", "n"]], "%{customdata[0]}<br>%{customdata[1]} interventions<br>%{z:.1f}%", "Interventions par commune")
+            st.plotly_chart(f, use_container_width=True)
+            prof.lap("Carte communes")
+            if hors_zone:
+                st.caption(f"{hors_zone} interventions dans des communes non cartographiées.")
+            if missing_communes():
+                st.caption("Contours des communes indisponibles : seule la carte de Paris est affichée.")
+
+if tab_donnees.open:
+    with tab_donnees:
+        paged_table(interventions, key="interventions")
+        export_button(interventions)
+        prof.lap("Tableau")
@@ -1,24 +1,64 @@
+import functools
 import json
+import math
+import os
+import tempfile
+import uuid
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import requests
 import streamlit as st
 
+from cache import ResultCache, freeze
+from engine import BitmapIndex, build_cube, build_interventions, date_bounds
+from export import FORMATS, XLSX_MAX_ROWS, write_export
+from maps import DEPARTEMENTS, GEO, commune_geojson, commune_table, communes_path, simplify_geojson
+from profiling import Profiler, waterfall
+from store import Store
+
 ROOT = Path(__file__).parent
 LOGO = ROOT / "enedis_logo.png"
-GEO = ROOT / "arrondissements.geojson"
+
+# Columns of the interventions tables, in display order.
+TABLE_COLUMNS = [
+    "PRM", "Prestation", "Perimètre géographique", "Libelle du BI", "Commune",
+    "Code et libelle Uo", "Origine", "Date de programmation", "Date de réalisation",
+    "Statut de l'intervention", "Etat de réalisation", "Motif de non réalisation",
+    "Temps théorique", "Temps réalisé", "Agent", "CDT", "Commentaire du technicien",
+]
+PAGE_SIZES = (50, 100, 500)
+
+# Limits of the cache shared by the page computations, see ``cached``.
+CACHE_ENTRIES = int(os.environ.get("DASHBOARD_CACHE_ENTRIES", 512))
+CACHE_MB = int(os.environ.get("DASHBOARD_CACHE_MB", 256))
+
+# Opt-in timing of the page stages, see ``profiler``.
+PROFILE = os.environ.get("DASHBOARD_PROFILE", "") not in ("", "0")
+PROFILE_LOG = Path(os.environ.get("DASHBOARD_PROFILE_LOG", ROOT / ".cache" / "profile.jsonl"))
+
+# Missing map and logo files are not downloaded when set, e.g. on a server
+# without internet access.
+OFFLINE = os.environ.get("DASHBOARD_OFFLINE", "") not in ("", "0")
+# Seconds to wait for a connection; an unreachable host fails quickly while
+# large files keep the longer read timeout of each download.
+CONNECT_TIMEOUT = 3
 
 
-def _download(url: str, dest: Path, timeout: int = 15) -> None:
-    """Download a file to dest, show a warning on failure."""
+def _download(url: str, dest: Path, timeout: int = 15, warn: bool = True) -> bool:
+    """Download a file to dest and return ``False`` on failure, with a short warning if *warn*."""
+    if OFFLINE:
+        return False
     try:
-        r = requests.get(url, timeout=timeout)
+        r = requests.get(url, timeout=(CONNECT_TIMEOUT, timeout))
         r.raise_for_status()
-    except Exception as e:
-        st.warning(f"Impossible de télécharger {url} : {e}")
-        return
+    except requests.RequestException:
+        if warn:
+            st.warning(f"Impossible de télécharger {dest.name}.")
+        return False
     dest.write_bytes(r.content)
+    return True
 
 
 @st.cache_resource(show_spinner=False)
@@ -52,35 +92,255 @@ def get_geojson():
     return None
 
 
-def build_interventions(df: pd.DataFrame) -> pd.DataFrame:
-    """Return a deduplicated view of *df* using the (PRM, date, équipe) rule.
+@st.cache_resource(show_spinner=False)
+def get_communes():
+    """Return the GeoJSON of the service area communes, Paris split by arrondissement.
+
+    The communes of each département are read from the files committed next
+    to the arrondissements file. A missing file is downloaded once from the
+    geo API; after a failed download the other départements are not
+    attempted, see :func:`missing_communes`.
+    """
+    deps = []
+    online = True
+    for dep in DEPARTEMENTS:
+        path = communes_path(dep)
+        if not path.exists() and online:
+            online = _download(
+                f"https://geo.api.gouv.fr/departements/{dep}/communes?fields=nom,code&format=geojson&geometry=contour",
+                path,
+                timeout=30,
+                warn=False,
+            )
+        if path.exists():
+            try:
+                deps.append(json.loads(path.read_text(encoding="utf-8")))
+            except Exception as e:
+                st.warning(f"Erreur de lecture {path}: {e}")
+    gj = commune_geojson(get_geojson(), deps)
+    return gj if gj["features"] else None
+
+
+def missing_communes() -> bool:
+    """Return whether the commune map lacks départements, to be shown once by the pages.
+
+    It is not part of the cached :func:`get_communes`, whose warnings would be
+    replayed by every cached function calling it.
+    """
+    return not all(communes_path(dep).exists() for dep in DEPARTEMENTS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_commune_table():
+    """Return the code, name and centroid of the communes, or ``None``."""
+    gj = get_communes()
+    return commune_table(gj) if gj else None
+
+
+@st.cache_resource(show_spinner=False)
+def get_commune_map():
+    """Return the simplified geometry of the service area communes, or ``None``.
+
+    It is shared by every commune map drawn with :func:`maps.choropleth`.
+    """
+    gj = get_communes()
+    return simplify_geojson(gj, key="code") if gj else None
+
+
+@st.cache_resource(show_spinner=False)
+def get_base_map():
+    """Return the simplified geometry of the arrondissements, or ``None``.
+
+    The geometry is simplified once and shared by every arrondissement map;
+    pages only fill in the values with :func:`maps.choropleth`.
+    """
+    gj = get_geojson()
+    return simplify_geojson(gj) if gj else None
+
+
+def value_counts(s: pd.Series) -> pd.Series:
+    """Return ``s.value_counts()`` without the unused categories of a categorical."""
+    vc = s.value_counts()
+    return vc[vc > 0]
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    """Return the computation cache shared by every session."""
+    return ResultCache(max_entries=CACHE_ENTRIES, max_bytes=CACHE_MB * 2**20)
+
+
+def _is_data(value) -> bool:
+    """Return whether *value* is a frame, or a cube of frames, derived from the dataset."""
+    if isinstance(value, dict):
+        return bool(value) and all(isinstance(v, pd.DataFrame) for v in value.values())
+    return isinstance(value, pd.DataFrame)
+
+
+def cached(func):
+    """Cache *func* per dataset version and filter parameters.
 
-    - PRM is cleaned to remove decimal suffixes.
-    - The date is taken from the "Date de réalisation" column and reduced to the
-      calendar day.
-    - L'équipe corresponds to the couple Agent + CDT.
+    Unlike ``st.cache_data``, DataFrame and cube arguments are not hashed: they are
+    identified by the ``data_key`` of the loaded dataset together with the
+    other arguments, which include the ``_params`` tuple of the filters that
+    produced them. Frames are copied on the way out so callers may modify them.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (
+            func.__code__.co_filename,
+            func.__qualname__,
+            st.session_state.get("data_key"),
+            freeze([a for a in args if not _is_data(a)]),
+            freeze({k: v for k, v in kwargs.items() if not _is_data(v)}),
+        )
+        cache = get_result_cache()
+        hit, value = cache.get(key)
+        if not hit:
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+        return value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+    return wrapper
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_index(key: str, _df: pd.DataFrame) -> BitmapIndex:
+    """Return the filter index of the dataset identified by *key*."""
+    return BitmapIndex(_df)
+
+
+@cached
+def get_rows(df: pd.DataFrame, params: tuple) -> np.ndarray:
+    """Return the positions of the *df* rows selected by the filters *params*.
+
+    *params* is ``(start, end, selection)``, see :meth:`engine.BitmapIndex.rows`.
+    """
+    start, end, selection = params
+    return get_index(st.session_state["data_key"], df).rows(selection, start, end)
+
+
+@cached
+def get_interventions(df: pd.DataFrame, params: tuple) -> pd.DataFrame:
+    """Return the deduplicated interventions of the *df* rows selected by *params*.
 
-    If one of the key columns is missing, the original frame is returned.
+    Cached per filter state with :func:`get_rows`, so a rerun that keeps the
+    filters, such as a tab switch, neither filters nor deduplicates again.
     """
+    return build_interventions(df.take(get_rows(df, params)))
+
+
+@cached
+def get_selection_cube(interventions: pd.DataFrame, params: tuple) -> dict:
+    """Return the cube of the *interventions* selected by the filters *params*.
+
+    The cube is built from the deduplicated rows of the selection, so it
+    always agrees with them, and cached per filter state.
+    """
+    return build_cube(interventions)
+
+
+def get_store(key: str) -> Store | None:
+    """Return the aggregates precomputed by ``store.py`` for the dataset *key*, if any.
 
+    Only the manifest is read here; it is not cached so that a store written
+    while the app runs is picked up on the next rerun.
+    """
+    return Store.open(key)
+
+
+def sort_order(s: pd.Series, descending: bool = False) -> np.ndarray:
+    """Return the positions that sort *s*, missing values last, ties in frame order."""
+    return s.reset_index(drop=True).sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+
+
+@st.fragment
+def paged_table(df: pd.DataFrame, columns=TABLE_COLUMNS, key: str = "table") -> None:
+    """Show *df* one page at a time, sorted on the server.
+
+    Only the visible page, restricted to *columns*, is sent to the browser,
+    and sorting reads the sort column alone. The table is a fragment: paging
+    or sorting reruns it without rerunning the page.
+    """
+    cols = [c for c in columns if c in df.columns] if columns is not None else list(df.columns)
     if df.empty:
-        return df.copy()
+        st.info("Aucune ligne à afficher.")
+        return
+    c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+    by = c1.selectbox("Trier par", [None, *cols], format_func=lambda c: "Ordre chronologique" if c is None else c, key=f"{key}_sort")
+    descending = c2.toggle("Décroissant", key=f"{key}_desc")
+    size = c3.selectbox("Lignes par page", PAGE_SIZES, index=1, key=f"{key}_size")
+    pages = math.ceil(len(df) / size)
+    page = c4.number_input("Page", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    lo, hi = (page - 1) * size, min(page * size, len(df))
+    if by is None:
+        positions = np.arange(lo, hi)
+        if descending:
+            positions = len(df) - 1 - positions
+    else:
+        positions = sort_order(df[by], descending)[lo:hi]
+    st.dataframe(df.iloc[positions][cols], hide_index=True, use_container_width=True)
+    st.caption(f"Lignes {lo + 1:,} à {hi:,} sur {len(df):,}".replace(",", " "))
 
-    res = df.copy()
 
-    if "PRM" in res.columns:
-        res["PRM_clean"] = res["PRM"].apply(lambda x: str(x).split(".")[0] if pd.notna(x) else pd.NA)
+@st.fragment
+def export_button(df: pd.DataFrame, columns=TABLE_COLUMNS, name: str = "interventions", key: str = "export") -> None:
+    """Offer the rows of *df* for download in one of the export ``FORMATS``.
+
+    The file is only produced when the button is clicked: rows are written
+    by chunks to a temporary file, restricted to *columns*, so the frame is
+    never converted whole. Streamlit serves downloads from memory only, so
+    the finished file is then held once in memory until it is downloaded:
+    an export needs about its file size in RAM on top of the dataset.
+    """
+    c1, c2 = st.columns([1, 3])
+    fmt = c1.selectbox("Format d'export", list(FORMATS), key=f"{key}_fmt", label_visibility="collapsed")
+    ext, mime = FORMATS[fmt]
+    if fmt == "Excel" and len(df) > XLSX_MAX_ROWS:
+        c2.warning("Trop de lignes pour un fichier Excel : choisissez CSV ou Parquet.")
+        return
+
+    def _data() -> bytes:
+        with tempfile.TemporaryFile() as out:
+            write_export(df, fmt, out, columns)
+            out.seek(0)
+            return out.read()
+
+    c2.download_button(
+        f"Exporter {len(df):,} lignes".replace(",", " "),
+        _data,
+        file_name=f"{name}.{ext}",
+        mime=mime,
+        key=f"{key}_dl",
+    )
 
-    if "Date de réalisation" in res.columns:
-        res["Date_intervention"] = pd.to_datetime(res["Date de réalisation"], errors="coerce").dt.date
 
-    agent = res["Agent"].fillna("") if "Agent" in res.columns else pd.Series("", index=res.index)
-    cdt = res["CDT"].fillna("") if "CDT" in res.columns else pd.Series("", index=res.index)
-    res["Equipe"] = (agent.astype(str) + " / " + cdt.astype(str)).str.strip(" /")
+@st.cache_data(show_spinner=False)
+def memory_report(key: str, _df: pd.DataFrame) -> pd.DataFrame:
+    """Return the memory used by each column of the loaded dataset, in MiB."""
+    mem = _df.memory_usage(deep=True, index=False) / 2**20
+    return (
+        pd.DataFrame({"Colonne": mem.index, "Type": _df.dtypes.astype(str).values, "Mo": mem.round(2).values})
+        .sort_values("Mo", ascending=False)
+    )
+
+
+def profiler(page: str) -> Profiler:
+    """Return the lap timer of this run of *page*.
+
+    When ``DASHBOARD_PROFILE`` is set, each lap is appended to ``PROFILE_LOG``
+    and the waterfall of the run is redrawn at the top of the sidebar;
+    otherwise laps are ignored.
+    """
+    if not PROFILE:
+        return Profiler(page, enabled=False)
+    session = st.session_state.setdefault("profile_session", uuid.uuid4().hex[:12])
+    box = st.sidebar.expander("Profil d'exécution", expanded=True).empty()
 
-    keys = ["PRM_clean", "Date_intervention", "Equipe"]
-    if not set(keys).issubset(res.columns):
-        return res
+    def draw(p: Profiler) -> None:
+        with box.container():
+            st.caption(f"{p.total:.2f} s sur {len(p.records)} étapes")
+            st.plotly_chart(waterfall(p.records), use_container_width=True, key=f"profil_{len(p.records)}")
 
-    res = res.dropna(subset=["Date_intervention"]).drop_duplicates(subset=keys)
-    return res
+    return Profiler(page, session, PROFILE_LOG, draw)
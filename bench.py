@@ -0,0 +1,167 @@
+"""Benchmark of the dashboard pipeline on synthetic exports.
+
+Usage: ``python bench.py 10k 100k 1M --baselines bench_baselines.json [--save] [--tolerance 0.25]``
+
+Every stage is timed on datasets written by :mod:`synthetic` and compared to
+the baselines stored by a previous ``--save`` run on the same machine; the
+command exits with status 1 when a stage is slower than its baseline by more
+than the tolerance, and with status 2 when the baselines file is missing.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    MATRIX_DIMS, BitmapIndex, KeyIndex, agent_kpis, agent_matrix, build_cube, build_interventions, counts,
+    daily_counts, month_ids, monthly_bands, percentile_ranks, resample_counts, rollup, summarize,
+)
+from ingest import ROOT, load_snapshot, normalize, parse_workbook, save_snapshot
+from synthetic import parse_size, generate, write
+
+DATA = ROOT / ".cache" / "bench"
+# Reading an Excel export is much slower than the other stages; larger
+# datasets are only timed from their columnar files.
+XLSX_MAX = 200_000
+# Slowdowns below this many seconds are measurement noise, not regressions.
+MIN_DELTA = 0.05
+
+
+def _timed(func, repeat: int):
+    """Return the result of *func* and its best time over *repeat* calls."""
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = func()
+        best = min(best, time.perf_counter() - t)
+    return out, best
+
+
+def _dataset(rows: int, seed: int, xlsx: bool) -> tuple[Path, Path | None]:
+    """Return the parquet and, if asked, xlsx exports of *rows* rows, writing them once."""
+    dest = DATA / f"synthetic_{rows}_{seed}"
+    formats = [f for f, want in (("parquet", True), ("xlsx", xlsx)) if want and not dest.with_suffix(f".{f}").exists()]
+    if formats:
+        write(generate(rows, seed), dest, formats)
+    return dest.with_suffix(".parquet"), dest.with_suffix(".xlsx") if xlsx else None
+
+
+def _selection(index: BitmapIndex) -> dict:
+    """Return sidebar filters keeping most of the data, as a typical session would."""
+    prestations = index.values("Prestation")
+    return {
+        "Année": index.values("Année"),
+        "Prestation": prestations[: max(len(prestations) * 3 // 4, 1)],
+        "Agence": index.values("Agence"),
+    }
+
+
+def run(rows: int, seed: int = 0, repeat: int = 3) -> dict:
+    """Return the time of every stage of the pipeline on *rows* synthetic rows."""
+    parquet, xlsx = _dataset(rows, seed, rows <= XLSX_MAX)
+    times = {}
+
+    def stage(name, func, n=repeat):
+        out, times[name] = _timed(func, n)
+        return out
+
+    if xlsx is not None:
+        stage("load_xlsx", lambda: parse_workbook(str(xlsx)), 1)
+    df = stage("load_parquet", lambda: normalize(pd.read_parquet(parquet)), 1)
+    key = f"bench-{rows}-{seed}"
+    save_snapshot(key, df, DATA)
+    df = stage("load_snapshot", lambda: load_snapshot(key, DATA))
+
+    interventions = stage("build_interventions", lambda: build_interventions(df))
+    index = stage("index", lambda: BitmapIndex(df))
+    stage("cube", lambda: build_cube(interventions))
+    selection = _selection(index)
+    start, end = index.date_range
+    flt = stage("filter", lambda: df.take(index.rows(selection, start, end)))
+
+    def main_page():
+        part = build_interventions(flt)
+        return summarize(part, build_cube(part))
+
+    stage("page_principale", main_page)
+
+    tech = counts(interventions["Agent"]).index[0]
+    one = {**selection, "Agent": [tech]}
+
+    def detail():
+        part = build_interventions(df.take(index.rows(one, start, end)))
+        sub = build_cube(part)
+        out = [rollup(sub, col) for col in ("Année", "Prestation", "Statut de l'intervention", "Origine", "Arr")]
+        out += [counts(part[col]) for col in ("Libelle du BI", "PRM_clean", "Commune")]
+        return out, resample_counts(daily_counts(part["Date de programmation"]))
+
+    stage("page_detail", detail)
+
+    def comparison():
+        fleet = build_interventions(flt)
+        matrix = agent_matrix(fleet.assign(Période=month_ids(fleet)), MATRIX_DIMS)
+        agents = matrix.index[matrix["total"]["n"] > 0]
+        return monthly_bands(matrix["Période"], agents[0], agents[1:])
+
+    stage("page_comparatif", comparison)
+
+    prm_index = stage("prm_index", lambda: KeyIndex(interventions["PRM_clean"]))
+    prm = counts(interventions["PRM_clean"]).index[0]
+
+    def prm_page():
+        part = interventions.take(prm_index.rows(prm))
+        return prm_index.search(str(prm)[:6]), resample_counts(daily_counts(part["Date_intervention"]))
+
+    stage("page_prm", prm_page)
+    stage("page_classement", lambda: percentile_ranks(agent_kpis(build_interventions(flt))))
+    return times
+
+
+def compare(times: dict, baselines: dict, tolerance: float) -> list[str]:
+    """Return a message for every stage of *times* slower than its baseline."""
+    out = []
+    for name, t in times.items():
+        base = baselines.get(name)
+        if base is not None and t > base * (1 + tolerance) and t - base > MIN_DELTA:
+            out.append(f"{name}: {t:.3f}s, baseline {base:.3f}s (+{(t / base - 1) * 100:.0f}%)")
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the dashboard pipeline on synthetic exports.")
+    parser.add_argument("sizes", nargs="*", default=["10k", "100k", "1M"], help="row counts, e.g. 10k 1M 5M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best one is kept")
+    parser.add_argument("--baselines", type=Path, required=True, help="JSON file of the reference times of this machine")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 for 25%%")
+    parser.add_argument("--save", action="store_true", help="store the times as the new baselines")
+    args = parser.parse_args(argv)
+
+    if not args.baselines.exists() and not args.save:
+        parser.error(f"no baselines at {args.baselines}, record them first with --save")
+    baselines = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    times = {}
+    for size in args.sizes:
+        rows = parse_size(size)
+        for name, t in run(rows, args.seed, args.repeat).items():
+            times[f"{rows}/{name}"] = t
+            base = baselines.get(f"{rows}/{name}")
+            print(f"{rows:>9} {name:<20} {t:8.3f}s" + (f"  baseline {base:8.3f}s" if base is not None else ""))
+
+    if args.save:
+        args.baselines.write_text(json.dumps({**baselines, **times}, indent=1, sort_keys=True))
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    regressions = compare(times, baselines, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
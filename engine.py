@@ -0,0 +1,632 @@
+"""Row selection shared by every page, independent from Streamlit."""
+
+import numpy as np
+import pandas as pd
+
+from ingest import _n, add_keys
+
+DATE = "Date de réalisation"
+
+# Columns offered as sidebar filters on the pages. The calendar fields are
+# answered from the date order of the rows, the others from bitmaps.
+CALENDAR_COLUMNS = ("Année", "Mois", "Jour")
+FILTER_COLUMNS = (
+    "Agent", "Agence", "Prestation", "Code et libelle Uo",
+    "Statut de l'intervention", "Etat de réalisation",
+)
+
+ONE_DAY = np.timedelta64(1, "D")
+
+
+def _day(value) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+
+def date_slice(dates: np.ndarray, start=None, end=None) -> slice:
+    """Return the rows of the sorted *dates* falling between *start* and *end*.
+
+    Both bounds are calendar days and are inclusive; ``None`` leaves a side
+    open.
+    """
+    lo = 0 if start is None else int(np.searchsorted(dates, _day(start).astype(dates.dtype), "left"))
+    hi = len(dates) if end is None else int(np.searchsorted(dates, (_day(end) + ONE_DAY).astype(dates.dtype), "left"))
+    return slice(lo, max(lo, hi))
+
+
+def date_bounds(value) -> tuple:
+    """Return the (start, end) days picked with a ``st.date_input`` range."""
+    if isinstance(value, (list, tuple)):
+        if len(value) == 2:
+            return value[0], value[1]
+        return (value[0], value[0]) if value else (None, None)
+    return value, value
+
+
+def _codes(s: pd.Series) -> np.ndarray:
+    """Return integer codes identifying the values of *s* (``-1`` for missing)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy()
+    return pd.factorize(s)[0]
+
+
+def duplicated_keys(df: pd.DataFrame, keys: list[str]) -> np.ndarray:
+    """Return a mask flagging rows whose *keys* already appeared above.
+
+    The codes of each key are packed into a single int64 so that duplicates
+    are found with one hash pass over integers.
+    """
+    packed = np.zeros(len(df), dtype=np.int64)
+    span = 1
+    for k in keys:
+        c = _codes(df[k]).astype(np.int64) + 1
+        width = int(c.max(initial=0)) + 1
+        if span * width >= 2**63:
+            return pd.DataFrame({k: _codes(df[k]) for k in keys}).duplicated().to_numpy()
+        packed += c * span
+        span *= width
+    return pd.Series(packed).duplicated().to_numpy()
+
+
+def build_interventions(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a deduplicated view of *df* using the (PRM, date, équipe) rule.
+
+    The first row of each duplicate group is kept. The loaded frames are
+    sorted by day only, so that row is the first one in the exports.
+
+    The keys ``PRM_clean``, ``Date_intervention`` and ``Equipe`` are derived
+    once at load time by :func:`ingest.add_keys`; they are only computed here
+    for frames that do not carry them. The frame is not copied when it holds
+    no duplicate.
+
+    If the PRM column is missing, *df* is returned without deduplication.
+    """
+
+    if df.empty:
+        return df
+
+    keys = ["PRM_clean", "Date_intervention", "Equipe"]
+    if not set(keys).issubset(df.columns):
+        df = add_keys(df.copy())
+        if not set(keys).issubset(df.columns):
+            return df
+
+    keep = df["Date_intervention"].notna().to_numpy() & ~duplicated_keys(df, keys)
+    return df if keep.all() else df[keep]
+
+
+class BitmapIndex:
+    """Date order and packed bitmaps answering the sidebar selections.
+
+    The frame is expected sorted by the day of ``DATE``, as produced by ``ingest._p``:
+    years and date ranges then resolve to contiguous row slices found with
+    ``searchsorted``, and the month/day masks and value bitmaps are only
+    evaluated inside those slices. Within a column the bitmaps of the
+    selected values are OR-ed, and the columns are AND-ed together.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns=FILTER_COLUMNS):
+        self.n = len(df)
+        self.distinct: dict[str, list] = {}
+        self.calendar: dict[str, np.ndarray] = {}
+        for col in CALENDAR_COLUMNS:
+            if col in df.columns:
+                values = df[col].to_numpy()
+                self.calendar[col] = values
+                self.distinct[col] = np.unique(values).tolist()
+
+        dates = df[DATE].to_numpy().astype("datetime64[D]") if DATE in df.columns else None
+        self.sorted = dates is not None and bool(pd.Index(dates).is_monotonic_increasing)
+        self.dates = dates if self.sorted else None
+
+        self.bitmaps: dict[str, dict] = {}
+        self.complete: dict[str, bool] = {}
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col], sort=True)
+            values = np.asarray(uniques).tolist()
+            self.bitmaps[col] = {v: np.packbits(codes == i) for i, v in enumerate(values)}
+            self.complete[col] = bool((codes >= 0).all())
+            self.distinct[col] = values
+
+    def values(self, col: str) -> list:
+        """Return the sorted distinct values of *col*, missing values excluded."""
+        return self.distinct.get(col, [])
+
+    @property
+    def date_range(self) -> tuple | None:
+        """Return the first and last day of the dataset, if it is date sorted."""
+        if not self.sorted or not self.n:
+            return None
+        return pd.Timestamp(self.dates[0]).date(), pd.Timestamp(self.dates[-1]).date()
+
+    def constraints(self, selection: dict, start=None, end=None) -> dict:
+        """Return the entries of *selection* that exclude rows of the dataset.
+
+        Columns mapped to ``None``, to every one of their values or unknown to
+        the index exclude nothing, as in :meth:`rows`. Date bounds cutting the
+        dataset are returned under ``DATE`` as a ``(start, end)`` pair.
+        """
+        out = {}
+        for col, selected in selection.items():
+            if selected is None or col not in self.distinct:
+                continue
+            if col in self.bitmaps and not self.complete[col]:
+                out[col] = selected
+            elif not set(selected).issuperset(self.distinct[col]):
+                out[col] = selected
+        bounds = self.date_range
+        if (start is not None or end is not None) and (
+            bounds is None
+            or (start is not None and _day(start) > _day(bounds[0]))
+            or (end is not None and _day(end) < _day(bounds[1]))
+        ):
+            out[DATE] = (start, end)
+        return out
+
+    def _slices(self, years, start, end) -> list[slice]:
+        """Return the row slices covering the selected years and date range."""
+        if not self.sorted:
+            return [slice(0, self.n)]
+        outer = date_slice(self.dates, start, end)
+        if years is None or "Année" not in self.calendar:
+            return [outer]
+        out = []
+        for y in sorted(set(years)):
+            s = date_slice(self.dates, f"{y}-01-01", f"{y}-12-31")
+            lo, hi = max(s.start, outer.start), min(s.stop, outer.stop)
+            if lo >= hi:
+                continue
+            if out and out[-1].stop == lo:
+                out[-1] = slice(out[-1].start, hi)
+            else:
+                out.append(slice(lo, hi))
+        return out
+
+    def _bits(self, col: str, selected, lo: int, hi: int) -> np.ndarray | None:
+        """Return the selected rows of *col* within ``[lo, hi)``, or ``None``."""
+        bitmaps = self.bitmaps[col]
+        selected = set(selected)
+        if self.complete[col] and selected.issuperset(bitmaps):
+            return None
+        b0, b1 = lo // 8, (hi + 7) // 8
+        acc = np.zeros(b1 - b0, dtype=np.uint8)
+        for v in selected:
+            b = bitmaps.get(v)
+            if b is not None:
+                acc |= b[b0:b1]
+        off = lo - b0 * 8
+        return np.unpackbits(acc)[off:off + hi - lo].astype(bool)
+
+    def rows(self, selection: dict, start=None, end=None) -> np.ndarray:
+        """Return the positions of the rows matching *selection*.
+
+        *selection* maps a column to the accepted values. Columns mapped to
+        ``None`` or unknown to the index are not constrained; as with
+        ``isin``, rows with a missing value never match a constrained column.
+        *start* and *end* optionally bound ``DATE`` by calendar day.
+        """
+        years = selection.get("Année")
+        calendar = {
+            col: selected for col, selected in selection.items()
+            if col in self.calendar and selected is not None
+            and not (col == "Année" and self.sorted)
+            and not set(selected).issuperset(self.distinct[col])
+        }
+        if not self.sorted and (start is not None or end is not None):
+            raise ValueError(f"date bounds need a frame sorted by the day of {DATE!r}")
+
+        out = []
+        for s in self._slices(years, start, end):
+            lo, hi = s.start, s.stop
+            keep = None
+            for col, selected in calendar.items():
+                values = self.calendar[col][lo:hi]
+                lut = np.zeros(int(values.max(initial=0)) + 1, dtype=bool)
+                lut[[v for v in selected if 0 <= v < len(lut)]] = True
+                m = lut[values]
+                keep = m if keep is None else keep & m
+            for col, selected in selection.items():
+                if selected is None or col not in self.bitmaps:
+                    continue
+                m = self._bits(col, selected, lo, hi)
+                if m is not None:
+                    keep = m if keep is None else keep & m
+            out.append(np.arange(lo, hi) if keep is None else np.flatnonzero(keep) + lo)
+        return np.concatenate(out) if out else np.empty(0, dtype=np.intp)
+
+
+class KeyIndex:
+    """Row positions of every value of a high-cardinality column such as a PRM.
+
+    Positions are grouped by value in a single array, with ``offsets`` giving
+    the bounds of each group, and keep the frame order inside a group: in a
+    frame sorted by date the rows of a value stay sorted by date. Values are
+    kept sorted so that prefix searches are answered by bisection.
+    """
+
+    def __init__(self, s: pd.Series):
+        codes, uniques = _factorize(s)
+        valid = codes >= 0
+        sizes = np.bincount(codes[valid], minlength=len(uniques))
+        keys = np.asarray(uniques, dtype=object).astype(str)
+        used = np.flatnonzero(sizes)
+        used = used[np.argsort(keys[used], kind="stable")]
+        rank = np.full(len(uniques), -1, dtype=np.int64)
+        rank[used] = np.arange(len(used))
+
+        ranked = rank[codes[valid]]
+        self.keys = keys[used]
+        self.positions = np.flatnonzero(valid)[np.argsort(ranked, kind="stable")]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes[used])])
+        self._lookup = {k: i for i, k in enumerate(self.keys.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def rows(self, key) -> np.ndarray:
+        """Return the positions of the rows holding *key*, in frame order."""
+        i = self._lookup.get(str(key))
+        if i is None:
+            return np.empty(0, dtype=np.intp)
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def _prefix(self, prefix: str) -> tuple[int, int]:
+        lo = int(np.searchsorted(self.keys, prefix, "left"))
+        hi = int(np.searchsorted(self.keys, prefix + "\U0010ffff", "left"))
+        return lo, hi
+
+    def count(self, prefix: str = "") -> int:
+        """Return the number of values starting with *prefix*."""
+        lo, hi = self._prefix(prefix)
+        return hi - lo
+
+    def search(self, prefix: str = "", limit: int = 50) -> list[str]:
+        """Return the first *limit* values starting with *prefix*, in sorted order."""
+        lo, hi = self._prefix(prefix)
+        return self.keys[lo:min(hi, lo + limit)].tolist()
+
+
+# Grouping sets of the intervention cube, one per chart family. Each set is
+# aggregated on its own so the cube holds about as many rows as the charts
+# draw bars; ``Mois_nom`` depends on ``Mois`` and adds no combination, it
+# only saves recomputing the labels.
+CUBE_SETS = (
+    ("Année", "Mois", "Mois_nom"),
+    ("Prestation",),
+    ("Statut de l'intervention",),
+    ("Etat de réalisation",),
+    ("Code et libelle Uo",),
+    ("Origine",),
+    ("Motif de non réalisation",),
+    ("Arr",),
+    ("Libelle du BI",),
+    ("Commune",),
+)
+TIMES = {"Temps réalisé": "realise", "Temps théorique": "theorique"}
+
+
+def build_cube(interventions: pd.DataFrame, sets=CUBE_SETS) -> dict[tuple, pd.DataFrame]:
+    """Return intervention counts and time sums for every grouping set of *sets*.
+
+    The cube maps each set whose columns are all present to one frame with a
+    row per combination of its values, holding ``n`` interventions plus, for
+    each time column, the sum and number of known values so that means can be
+    rebuilt after summing. Missing values are kept as their own group.
+    """
+    measures = pd.DataFrame({"n": np.ones(len(interventions), dtype=np.int64)}, index=interventions.index)
+    for col, name in TIMES.items():
+        if col in interventions.columns:
+            measures[f"{name}_sum"] = interventions[col].fillna(0)
+            measures[f"{name}_n"] = interventions[col].notna().astype(np.int64)
+    cube = {}
+    for dims in sets:
+        if set(dims).issubset(interventions.columns):
+            keys = [interventions[d] for d in dims]
+            cube[tuple(dims)] = measures.groupby(keys, observed=True, dropna=False, sort=False).sum().reset_index()
+    return cube
+
+
+def cube_set(cube: dict, by) -> tuple | None:
+    """Return the smallest grouping set of *cube* holding every column of *by*, if any."""
+    cols = {by} if isinstance(by, str) else set(by)
+    sets = [dims for dims in cube if cols.issubset(dims)]
+    return min(sets, key=len) if sets else None
+
+
+def rollup(cube: dict, by) -> pd.DataFrame:
+    """Sum the cube measures over *by* and rebuild the mean times.
+
+    The smallest grouping set holding *by* is summed, see :func:`cube_set`.
+    Groups with a missing value in *by* are dropped, as ``value_counts`` does.
+    """
+    dims = cube_set(cube, by)
+    if dims is None:
+        raise KeyError(f"no grouping set of the cube holds {by!r}")
+    t = cube[dims]
+    measures = [c for c in t.columns if c == "n" or c.endswith(("_sum", "_n"))]
+    out = t.groupby(by, observed=True)[measures].sum().reset_index()
+    for col, name in TIMES.items():
+        if f"{name}_sum" in out.columns:
+            out[col] = out[f"{name}_sum"] / out[f"{name}_n"].where(out[f"{name}_n"] > 0)
+    return out
+
+
+def _factorize(s: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Return the integer codes of *s* (``-1`` for missing) and their values."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories
+    codes, uniques = pd.factorize(s)
+    return codes, pd.Index(uniques)
+
+
+def counts(s: pd.Series) -> pd.Series:
+    """Return the value counts of *s*, most frequent first, from integer codes."""
+    codes, uniques = _factorize(s)
+    vc = pd.Series(np.bincount(codes[codes >= 0], minlength=len(uniques)), index=uniques, name="n")
+    return vc[vc > 0].sort_values(ascending=False, kind="stable").rename_axis(s.name)
+
+
+def partition(s: pd.Series) -> list[tuple[object, np.ndarray]]:
+    """Return each distinct value of *s*, in sorted order, with the positions of its rows."""
+    codes, values = pd.factorize(s, sort=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+    return [(value, order[bounds[i]:bounds[i + 1]]) for i, value in enumerate(values)]
+
+
+def daily_counts(s: pd.Series) -> pd.DataFrame:
+    """Return the number of rows per calendar day of the datetimes in *s*."""
+    days = pd.to_datetime(s, errors="coerce").to_numpy().astype("datetime64[D]")
+    days = days[~np.isnat(days)]
+    if not len(days):
+        return pd.DataFrame({"Date": pd.Series(dtype="datetime64[ns]"), "n": pd.Series(dtype=np.int64)})
+    first = days.min()
+    n = np.bincount((days - first).astype(np.int64))
+    nz = np.flatnonzero(n)
+    return pd.DataFrame({"Date": first + nz.astype("timedelta64[D]"), "n": n[nz]})
+
+
+# Most bars drawn by a time series chart; longer series are grouped by week,
+# then by month. Steps are (unit, pandas frequency, days per bar).
+MAX_POINTS = 366
+RESAMPLING = (("jour", None, 1), ("semaine", "W-MON", 7), ("mois", "MS", 31))
+
+
+def resample_counts(daily: pd.DataFrame, max_points: int = MAX_POINTS) -> tuple[pd.DataFrame, str]:
+    """Return the ``Date``/``n`` counts of *daily* grouped by day, week or month.
+
+    The finest step of ``RESAMPLING`` that keeps the span of the dates under
+    *max_points* bars is used; it is returned with the frame. Weeks start on
+    Monday and months on their first day, which label the bars.
+    """
+    if daily.empty:
+        return daily, "jour"
+    span = (daily["Date"].max() - daily["Date"].min()).days + 1
+    for unit, freq, days in RESAMPLING:
+        if span <= max_points * days:
+            break
+    if freq is None:
+        return daily, unit
+    s = daily.set_index("Date")["n"].resample(freq, label="left", closed="left").sum()
+    return s[s > 0].rename_axis("Date").reset_index(), unit
+
+
+def _metrics(interventions: pd.DataFrame) -> dict:
+    """Return the duration indicators shown above the dashboard."""
+    out = {"n": len(interventions)}
+    r = interventions["Temps réalisé"] if "Temps réalisé" in interventions.columns else None
+    t = interventions["Temps théorique"] if "Temps théorique" in interventions.columns else None
+    if r is not None:
+        out.update(realise_moy=r.mean(), realise_max=r.max(), realise_min=r.min())
+    if t is not None:
+        out["theorique_moy"] = t.mean()
+    if r is not None and t is not None:
+        out["ecart_moy"] = (r - t).mean()
+        out["taux_depassement"] = (r > t).mean() * 100
+    return out
+
+
+# Summaries of ``summarize`` rolled up from one grouping set of the cube each.
+ROLLUPS = (
+    ("prestation", "Prestation"), ("statut", "Statut de l'intervention"),
+    ("etat", "Etat de réalisation"), ("uo", "Code et libelle Uo"), ("origine", "Origine"),
+    ("motif", "Motif de non réalisation"), ("arr", "Arr"), ("bi", "Libelle du BI"), ("commune", "Commune"),
+)
+
+
+def summarize(interventions: pd.DataFrame, cube: dict, keys=None) -> dict:
+    """Return the summaries of the main dashboard as small frames.
+
+    Every breakdown is rolled up from the grouping sets of *cube*, built from
+    the same *interventions*: the yearly and monthly volumes from one sum of
+    the calendar set, the others from their own set. Only the metrics, the PRM
+    and the programming dates read the interventions, the last two with one
+    bincount over their codes. Only the summaries named in *keys* are
+    computed, all of them by default; summaries whose columns are missing are
+    left out of the bundle.
+    """
+    def want(key):
+        return keys is None or key in keys
+
+    out = {}
+    if want("metrics"):
+        out["metrics"] = _metrics(interventions)
+    if (want("annual") or want("monthly")) and cube_set(cube, ["Année", "Mois_nom"]):
+        monthly = rollup(cube, ["Année", "Mois_nom"])
+        if want("annual"):
+            out["annual"] = monthly.groupby("Année", observed=True)["n"].sum().reset_index()
+        if want("monthly"):
+            out["monthly"] = monthly[["Année", "Mois_nom", "n"]]
+    for key, col in ROLLUPS:
+        if want(key) and cube_set(cube, col):
+            out[key] = rollup(cube, col).sort_values("n", ascending=False, kind="stable")
+    if want("prm") and "PRM_clean" in interventions.columns:
+        out["prm"] = counts(interventions["PRM_clean"]).reset_index()
+    if want("programmation") and "Date de programmation" in interventions.columns:
+        out["programmation"] = daily_counts(interventions["Date de programmation"])
+    return out
+
+
+def agent_matrix(interventions: pd.DataFrame, dims, by: str = "Agent", times_by: str = "Prestation") -> pd.DataFrame:
+    """Return the interventions of every agent broken down by each of *dims*.
+
+    The result has one row per value of *by* and two column levels: the
+    dimension, then its values. The ``"total"`` block holds the number of
+    interventions ``n`` and, for each time column, the sum and number of known
+    values; the ``"<time>_sum"`` and ``"<time>_n"`` blocks break those down by
+    *times_by*. Every block is one bincount over packed integer codes, so
+    comparing agents afterwards is a row lookup.
+    """
+    a, agents = _factorize(interventions[by])
+    keep = a >= 0
+    # Categorical codes may be int8 or int16, too narrow for the packed codes.
+    a = a[keep].astype(np.int64)
+    rows = pd.Index(agents, name=by)
+
+    def _cross(col, weights=None):
+        c, uniques = _factorize(interventions[col])
+        c = c[keep]
+        known = c >= 0
+        k = len(uniques)
+        w = None if weights is None else weights[known]
+        m = np.bincount(a[known] * k + c[known], weights=w, minlength=len(rows) * k)
+        return pd.DataFrame(m.reshape(len(rows), k), index=rows, columns=pd.Index(uniques, name=col))
+
+    total = {"n": np.bincount(a, minlength=len(rows))}
+    blocks = {}
+    for col in dims:
+        if col in interventions.columns:
+            blocks[col] = _cross(col)
+    for col, name in TIMES.items():
+        if col not in interventions.columns:
+            continue
+        v = interventions[col].to_numpy(dtype=float, na_value=np.nan)[keep]
+        known = ~np.isnan(v)
+        total[f"{name}_sum"] = np.bincount(a, weights=np.where(known, v, 0), minlength=len(rows))
+        total[f"{name}_n"] = np.bincount(a, weights=known, minlength=len(rows))
+        if times_by in interventions.columns:
+            blocks[f"{name}_sum"] = _cross(times_by, np.where(known, v, 0))
+            blocks[f"{name}_n"] = _cross(times_by, known.astype(float))
+    return pd.concat({"total": pd.DataFrame(total, index=rows), **blocks}, axis=1)
+
+
+# Dimensions of the agent matrix compared on the comparison page; ``Période``
+# holds the :func:`month_ids` of the rows.
+MATRIX_DIMS = (
+    "Année", "Prestation", "Statut de l'intervention", "Etat de réalisation",
+    "Motif de non réalisation", "Libelle du BI", "Code et libelle Uo", "Origine", "Arr",
+    "Période",
+)
+
+
+def month_ids(interventions: pd.DataFrame) -> np.ndarray:
+    """Return ``Année * 12 + Mois - 1``, one consecutive integer per calendar month."""
+    return interventions["Année"].to_numpy(np.int32) * 12 + interventions["Mois"].to_numpy(np.int32) - 1
+
+
+def monthly_bands(block: pd.DataFrame, tech, agents, quantiles=(0.25, 0.75)) -> pd.DataFrame:
+    """Return the monthly volume of *tech* next to the spread of *agents*.
+
+    *block* holds agent x month counts keyed by :func:`month_ids`, as built by
+    :func:`agent_matrix`. It is spread on a dense array covering every month
+    between the first and the last one, so agents without activity in a month
+    count as zero toward the minimum, the mean and the quantiles. Every
+    statistic is then one reduction over the agent axis.
+    """
+    ids = block.columns.to_numpy(np.int64)
+    first = int(ids.min())
+    dense = np.zeros((len(block), int(ids.max()) - first + 1))
+    dense[:, ids - first] = block.to_numpy()
+    comp = dense[block.index.get_indexer(agents)]
+    names = np.asarray(agents, dtype=object)
+    out = pd.DataFrame({
+        "Date": (np.arange(dense.shape[1]) + first - 1970 * 12).astype("datetime64[M]").astype("datetime64[ns]"),
+        "tech": dense[block.index.get_loc(tech)],
+        "max": comp.max(axis=0),
+        "agent_max": names[comp.argmax(axis=0)],
+        "min": comp.min(axis=0),
+        "agent_min": names[comp.argmin(axis=0)],
+        "moyenne": comp.mean(axis=0),
+    })
+    for q in quantiles:
+        out[f"q{round(q * 100)}"] = np.quantile(comp, q, axis=0)
+    return out
+
+
+# Indicators of the technician leaderboard, mapped to whether a higher value
+# ranks better.
+KPIS = {
+    "Interventions": True,
+    "Temps réalisé moyen": False,
+    "Taux de dépassement (%)": False,
+    "Taux de non réalisation (%)": False,
+    "PRM distincts": True,
+}
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    return np.divide(num, den, out=np.full(len(num), np.nan), where=den > 0)
+
+
+def agent_kpis(interventions: pd.DataFrame, by: str = "Agent") -> pd.DataFrame:
+    """Return the ``KPIS`` of every agent, computed for all agents at once.
+
+    Each indicator is a bincount over the agent codes, so the cost does not
+    depend on the number of agents. The overrun and non realisation rates
+    are shares of all the interventions, as on the main page; an intervention
+    is not realised when its état starts with "non réalis", or, without an
+    état column, when it carries a motif de non réalisation. Indicators whose
+    columns are missing are left out.
+    """
+    a, agents = _factorize(interventions[by])
+    keep = a >= 0
+    a = a[keep]
+    k = len(agents)
+    n = np.bincount(a, minlength=k)
+    out = {"Interventions": n}
+
+    def _col(col):
+        return interventions[col].to_numpy(dtype=float, na_value=np.nan)[keep]
+
+    if "Temps réalisé" in interventions.columns:
+        r = _col("Temps réalisé")
+        known = ~np.isnan(r)
+        out["Temps réalisé moyen"] = _ratio(np.bincount(a, np.where(known, r, 0), k), np.bincount(a, known, k))
+        if "Temps théorique" in interventions.columns:
+            over = known & (r > np.nan_to_num(_col("Temps théorique"), nan=np.inf))
+            out["Taux de dépassement (%)"] = 100 * _ratio(np.bincount(a, over, k), n)
+
+    if "Etat de réalisation" in interventions.columns:
+        codes, etats = _factorize(interventions["Etat de réalisation"])
+        lut = np.append([_n(e).startswith("nonrealis") for e in etats], False)
+        failed = lut[codes[keep]]
+    elif "Motif de non réalisation" in interventions.columns:
+        failed = interventions["Motif de non réalisation"].notna().to_numpy()[keep]
+    else:
+        failed = None
+    if failed is not None:
+        out["Taux de non réalisation (%)"] = 100 * _ratio(np.bincount(a, failed, k), n)
+
+    if "PRM_clean" in interventions.columns:
+        p, prms = _factorize(interventions["PRM_clean"])
+        p = p[keep]
+        known = p >= 0
+        pairs = np.unique(a[known].astype(np.int64) * len(prms) + p[known])
+        out["PRM distincts"] = np.bincount(pairs // max(len(prms), 1), minlength=k)
+
+    kpis = pd.DataFrame(out, index=pd.Index(agents, name=by))
+    return kpis[n > 0]
+
+
+def percentile_ranks(kpis: pd.DataFrame) -> pd.DataFrame:
+    """Return the percentile of every agent against the others, per indicator.
+
+    100 is the best agent of the fleet: the percentile is the share of agents
+    doing no better, following the direction given by ``KPIS``. Missing
+    values stay missing.
+    """
+    return pd.DataFrame({
+        col: kpis[col].rank(method="max", ascending=KPIS.get(col, True), pct=True) * 100
+        for col in kpis.columns
+    })
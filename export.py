@@ -0,0 +1,74 @@
+"""Chunked export of the interventions tables, independent from Streamlit."""
+
+import io
+
+import pandas as pd
+
+# Export formats offered on the pages: file extension and MIME type.
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+CHUNK_ROWS = 50_000
+# Rows of an Excel sheet, header excluded.
+XLSX_MAX_ROWS = 1_048_575
+
+
+def _chunks(df: pd.DataFrame, columns, chunk_rows: int):
+    """Yield *df* restricted to *columns* by slices of *chunk_rows* rows."""
+    for lo in range(0, len(df), chunk_rows):
+        yield df.iloc[lo:lo + chunk_rows][columns]
+
+
+def _csv(df, columns, dest, chunk_rows):
+    text = io.TextIOWrapper(dest, encoding="utf-8-sig", newline="", write_through=True)
+    for i, chunk in enumerate(_chunks(df, columns, chunk_rows)):
+        chunk.to_csv(text, sep=";", index=False, header=i == 0)
+    text.detach()
+
+
+def _parquet(df, columns, dest, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # The schema comes from the dtypes of the whole frame, so a chunk whose
+    # column is all missing is cast to it instead of changing the file schema;
+    # columns without a typed dtype are written as strings.
+    schema = pa.Schema.from_pandas(df.head(0)[columns], preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    with pq.ParquetWriter(dest, schema) as writer:
+        for chunk in _chunks(df, columns, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _xlsx(df, columns, dest, chunk_rows):
+    from openpyxl import Workbook
+
+    if len(df) > XLSX_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows do not fit in an Excel sheet")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Interventions")
+    ws.append(list(columns))
+    for chunk in _chunks(df, columns, chunk_rows):
+        values = chunk.astype(object).to_numpy()
+        values[pd.isna(values)] = None
+        for row in values:
+            ws.append([v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row])
+    wb.save(dest)
+
+
+def write_export(df: pd.DataFrame, fmt: str, dest, columns=None, chunk_rows: int = CHUNK_ROWS) -> None:
+    """Write *df* to the binary file *dest* in the *fmt* format of ``FORMATS``.
+
+    Rows are converted and written *chunk_rows* at a time, restricted to
+    *columns*, so no full copy of the frame is made. Excel sheets are written
+    in streaming mode and are limited to ``XLSX_MAX_ROWS`` rows.
+    """
+    columns = [c for c in columns if c in df.columns] if columns is not None else list(df.columns)
+    writers = {"CSV": _csv, "Parquet": _parquet, "Excel": _xlsx}
+    if fmt not in writers:
+        raise ValueError(f"unknown export format {fmt!r}")
+    writers[fmt](df, columns, dest, chunk_rows)
@@ -0,0 +1,97 @@
+"""Charts of the detailed statistics page, independent from Streamlit.
+
+The builders take the counts shaped as the page computes them, with an
+``Interventions`` column, so that the page and the HTML reports of
+``report.py`` draw the same figures.
+"""
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from maps import choropleth
+
+ENEDIS_COLORS = ["#2C75FF", "#75C700", "#4A9BFF", "#A0D87C", "#0072F0", "#47B361", "#6EABFF", "#9EE08E"]
+
+
+def with_shares(t: pd.DataFrame) -> pd.DataFrame:
+    """Return *t* with the percentage of each row's interventions in ``%``."""
+    return t.assign(**{"%": (t["Interventions"] / t["Interventions"].sum() * 100).round(1)})
+
+
+def annual_volume(va: pd.DataFrame) -> go.Figure:
+    fig = px.bar(va, x="Année", y="Interventions", color="Année", color_discrete_sequence=ENEDIS_COLORS, title="Volume annuel")
+    fig.update_traces(text=va["Interventions"], textposition="outside", hovertemplate="Année %{x}<br>%{y} interventions")
+    return fig
+
+
+def monthly_volume(vm: pd.DataFrame) -> go.Figure:
+    return px.bar(
+        vm, x="Mois_nom", y="Interventions", color="Année", color_discrete_sequence=ENEDIS_COLORS,
+        barmode="group", title="Volume mensuel",
+    )
+
+
+def prestation_pie(t: pd.DataFrame) -> go.Figure:
+    fig = px.pie(
+        with_shares(t), names="Prestation", values="Interventions", hover_data=["%"],
+        title="Répartition prestations", color_discrete_sequence=ENEDIS_COLORS,
+    )
+    fig.update_traces(textinfo="percent+label", hovertemplate="%{label}<br>Interventions : %{value}<br>% : %{customdata[0]}")
+    return fig
+
+
+def share_bar(t: pd.DataFrame, x: str, title: str) -> go.Figure:
+    """Return the bars of the counts *t* by *x*, with their percentage on hover."""
+    fig = px.bar(
+        with_shares(t), x=x, y="Interventions", title=title, color_discrete_sequence=ENEDIS_COLORS,
+        hover_data={"%": True, "Interventions": True},
+    )
+    fig.update_traces(hovertemplate="%{x}<br>Interventions : %{y}<br>% : %{customdata[0]}%")
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def share_text_bar(t: pd.DataFrame, x: str, title: str) -> go.Figure:
+    """Return one coloured bar per *x* of the counts *t*, labelled with its percentage."""
+    fig = px.bar(with_shares(t), x=x, y="Interventions", text="%", color=x, color_discrete_sequence=ENEDIS_COLORS, title=title)
+    fig.update_traces(hovertemplate="%{x}<br>%{text}%")
+    return fig
+
+
+def count_bar(t: pd.DataFrame, x: str, title: str) -> go.Figure:
+    return px.bar(t, x=x, y="Interventions", title=title, color_discrete_sequence=ENEDIS_COLORS)
+
+
+def top_prm(top: pd.DataFrame) -> go.Figure:
+    fig = px.bar(
+        top, x="Rang", y="Interventions", color="PRM", color_discrete_sequence=ENEDIS_COLORS,
+        text="Interventions", title="Top 10 PRM (classés)",
+    )
+    fig.update_traces(textposition="outside", hovertemplate="Rang %{x}<br>%{y} interventions<br>PRM %{customdata}")
+    fig.update_layout(xaxis_title="Rang", yaxis_title="Nombre d’interventions")
+    return fig
+
+
+def programmations(t: pd.DataFrame, unit: str) -> go.Figure:
+    return px.bar(t, x="Date", y="Interventions", color_discrete_sequence=ENEDIS_COLORS, title=f"Volume des programmations par {unit}")
+
+
+def times_by_prestation(t: pd.DataFrame) -> go.Figure:
+    return px.bar(
+        t, x="Prestation", y=["Temps théorique", "Temps réalisé"], color_discrete_sequence=ENEDIS_COLORS[:2],
+        barmode="group", title="Temps théorique vs réalisé par prestation",
+    )
+
+
+def arr_map(base: dict, arr: pd.DataFrame) -> go.Figure:
+    """Return the map of the arrondissements *base* filled with the ``pct`` of interventions of each ``Arr``."""
+    return choropleth(base, arr["Arr"], arr["pct"], hovertemplate="Arr %{location}<br>%{z:.1f}%",
+                      title="Interventions par arrondissement (%)")
+
+
+def commune_map(base: dict, com: pd.DataFrame) -> go.Figure:
+    """Return the map of the communes *base* filled with the ``pct`` of interventions of each commune ``code``."""
+    return choropleth(base, com["code"], com["pct"], com[["nom", "n"]],
+                      hovertemplate="%{customdata[0]}<br>%{customdata[1]} interventions<br>%{z:.1f}%",
+                      title="Interventions par commune (%)")
@@ -0,0 +1,354 @@
+"""Loading helpers for the interventions exports, independent from Streamlit."""
+
+import functools
+import hashlib
+import io
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).parent
+SNAPSHOTS = ROOT / ".cache" / "snapshots"
+
+# Bump whenever the normalisation applied by ``_load`` changes so that stale
+# snapshots are ignored instead of being served with an outdated schema.
+SNAPSHOT_VERSION = 6
+
+# Normalised names of the columns every export must provide.
+REQUIRED = ("datederealisation", "commune")
+HEADER_SCAN_ROWS = 10
+CHUNK_ROWS = 20_000
+
+# Low-cardinality text columns kept as categoricals, and the narrowest integer
+# type holding each calendar field.
+CATEGORIES = (
+    "Agent", "CDT", "Prestation", "Code et libelle Uo", "Statut de l'intervention",
+    "Etat de réalisation", "Motif de non réalisation", "Commune", "Origine", "Agence",
+    "Libelle du BI", "PRM_clean", "Equipe",
+)
+INTEGERS = {"Année": "int16", "Mois": "int8", "Jour": "int8", "Arr": "Int8"}
+
+# Short month names indexed by month number, as ``strftime('%b')`` writes them.
+MONTH_NAMES = np.array([""] + [pd.Timestamp(2000, m, 1).strftime('%b') for m in range(1, 13)], dtype=object)
+
+
+@functools.lru_cache(maxsize=4096)
+def _n(x):
+    return ''.join(c for c in unicodedata.normalize('NFKD', str(x)) if not unicodedata.combining(c)).lower().replace(' ', '').replace('_', '')
+
+
+def find_header(rows) -> int | None:
+    """Return the position of the header row among *rows*, if any."""
+    for i, row in enumerate(rows):
+        names = {_n(v).strip() for v in row if v is not None}
+        if all(r in names for r in REQUIRED):
+            return i
+    return None
+
+
+def _columns(header) -> list[str]:
+    """Return unique column names the way ``pd.read_excel`` builds them."""
+    cols, seen = [], {}
+    for i, v in enumerate(header):
+        name = f"Unnamed: {i}" if v is None else str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        cols.append(name)
+    return cols
+
+
+def read_workbook(source, chunk_rows: int = CHUNK_ROWS, progress=None) -> pd.DataFrame | None:
+    """Read the first sheet of *source* in a single streaming pass.
+
+    The first rows are inspected to locate the header, then the remaining rows
+    are consumed by chunks of *chunk_rows* so that only one chunk of raw cell
+    tuples is held in memory at a time. *progress*, if given, is called with
+    the fraction of rows read. Returns ``None`` when no header is found.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        total = ws.max_row or 0
+        rows = ws.iter_rows(values_only=True)
+        head = list(islice(rows, HEADER_SCAN_ROWS))
+        h = find_header(head)
+        if h is None:
+            return None
+        cols = _columns(head[h])
+        w = len(cols)
+
+        def _chunk(block):
+            block = [r if len(r) == w else (tuple(r[:w]) + (None,) * (w - len(r))) for r in block]
+            return pd.DataFrame.from_records(block, columns=cols).dropna(how='all')
+
+        frames = [_chunk(head[h + 1:])] if len(head) > h + 1 else []
+        done = len(head)
+        while True:
+            block = list(islice(rows, chunk_rows))
+            if not block:
+                break
+            frames.append(_chunk(block))
+            done += len(block)
+            if progress and total:
+                progress(min(done / total, 1.0))
+    finally:
+        wb.close()
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(frames, ignore_index=True).infer_objects()
+
+
+def _p(df):
+    df.columns = df.columns.str.strip()
+    m = {_n(c): c for c in df.columns}
+    d = m.get('datederealisation')
+    c = m.get('commune')
+    if d is None or c is None:
+        return None
+
+    ap = m.get('agentprogramme')
+    ag = m.get('agent')
+    if ap and 'Agent' not in df.columns:
+        df.rename(columns={ap: 'Agent'}, inplace=True)
+    elif ag and 'Agent' not in df.columns:
+        df.rename(columns={ag: 'Agent'}, inplace=True)
+
+    rt = m.get('tempsrealise')
+    tt = m.get('tempstheorique')
+    if rt:
+        df.rename(columns={rt: 'Temps réalisé'}, inplace=True)
+        df['Temps réalisé'] = pd.to_numeric(df['Temps réalisé'], errors='coerce')
+    if tt:
+        df.rename(columns={tt: 'Temps théorique'}, inplace=True)
+        df['Temps théorique'] = pd.to_numeric(df['Temps théorique'], errors='coerce')
+
+    pg = m.get('perimetregeographique')
+    if pg :
+        df['Agence'] = derive(
+            df[pg],
+            lambda v: v.str.extract(r'AISMA\s+\d+_(.+)', expand=False).str.replace('_', ' ', regex=False).str.title(),
+            as_category=True,
+        )
+
+    if d != 'Date de réalisation':
+        df.rename(columns={d: 'Date de réalisation'}, inplace=True)
+        d = 'Date de réalisation'
+    df[d] = pd.to_datetime(df[d], errors='coerce')
+    # Rows are ordered by day only: within a day they keep the file order,
+    # which decides the row kept among duplicates by build_interventions.
+    df = df.dropna(subset=[d]).sort_values(d, kind='stable', key=lambda s: s.dt.normalize())
+    df['Année'] = df[d].dt.year
+    df['Mois'] = df[d].dt.month
+    df['Jour'] = df[d].dt.day
+    df['Mois_nom'] = MONTH_NAMES[df['Mois'].to_numpy()]
+    df['Arr'] = derive(df[c], lambda v: v.str.extract(r'PARIS\s*(\d{1,2})')[0].astype(float))
+    return compact(add_keys(df, d))
+
+
+def _from_codes(codes: np.ndarray, labels) -> pd.Categorical:
+    """Map *codes* through *labels*, merging labels that end up identical.
+
+    The categories are sorted, as ``astype("category")`` would sort them.
+    """
+    lc, lu = pd.factorize(pd.Index(labels), sort=True)
+    return pd.Categorical.from_codes(np.append(lc, -1)[codes], categories=lu)
+
+
+def _labels(uniques) -> np.ndarray:
+    """Return *uniques* as strings followed by ``""`` for the missing code."""
+    return np.append(np.asarray(uniques, dtype=object).astype(str), "")
+
+
+def derive(s: pd.Series, func, as_category: bool = False) -> pd.Series:
+    """Apply *func* once per distinct value of *s* and map the results back.
+
+    *func* receives the distinct values as strings, with ``""`` standing for
+    missing values, and returns a Series of the same length. The cost of
+    *func* follows the cardinality of *s* instead of its length. With
+    *as_category* the result is a categorical of the derived strings.
+    """
+    codes, uniq = pd.factorize(s)
+    values = func(pd.Series(_labels(uniq), dtype=object))
+    if as_category:
+        return pd.Series(_from_codes(codes, values.iloc[:-1]), index=s.index)
+    return pd.Series(values.to_numpy()[codes], index=s.index)
+
+
+def add_keys(df: pd.DataFrame, date_col: str = "Date de réalisation") -> pd.DataFrame:
+    """Add the columns identifying an intervention, in place.
+
+    - ``PRM_clean`` is the PRM without its decimal suffix.
+    - ``Date_intervention`` is *date_col* reduced to the calendar day.
+    - ``Equipe`` is the couple Agent + CDT.
+
+    Strings are built once per distinct PRM or (Agent, CDT) pair and mapped
+    back through the factorised codes, so the cost follows the cardinality.
+    """
+    n = len(df)
+    if "PRM" in df.columns:
+        codes, uniq = pd.factorize(df["PRM"])
+        clean = pd.Index(_labels(uniq)[:-1]).str.split(".").str[0]
+        df["PRM_clean"] = _from_codes(codes, clean)
+
+    if date_col in df.columns:
+        df["Date_intervention"] = pd.to_datetime(df[date_col], errors="coerce").dt.normalize()
+
+    ca, ua = pd.factorize(df["Agent"]) if "Agent" in df.columns else (np.full(n, -1), [])
+    cc, uc = pd.factorize(df["CDT"]) if "CDT" in df.columns else (np.full(n, -1), [])
+    width = len(uc) + 1
+    pairs, uniq = pd.factorize((ca.astype(np.int64) + 1) * width + cc + 1)
+    agent = _labels(ua)[uniq // width - 1]
+    cdt = _labels(uc)[uniq % width - 1]
+    team = (pd.Series(agent, dtype=object) + " / " + pd.Series(cdt, dtype=object)).str.strip(" /")
+    df["Equipe"] = _from_codes(pairs, team)
+    return df
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert *df* to the compact schema shared by every page, in place.
+
+    Text columns listed in ``CATEGORIES`` become categoricals of strings and
+    the calendar fields are narrowed to the types given in ``INTEGERS``.
+    """
+    for col in CATEGORIES:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            codes, uniq = pd.factorize(df[col])
+            df[col] = _from_codes(codes, _labels(uniq)[:-1])
+    for col, dtype in INTEGERS.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def normalize(raw: pd.DataFrame) -> pd.DataFrame | None:
+    """Normalise the rows of an export, or return ``None`` if it is not conform."""
+    o = _p(raw)
+    if o is None:
+        return None
+    return arrow_compatible(o.reset_index(drop=True))
+
+
+def parse_workbook(source, progress=None) -> pd.DataFrame | None:
+    """Read and normalise one export, or return ``None`` if it is not conform."""
+    try:
+        raw = read_workbook(source, progress=progress)
+    except Exception:
+        return None
+    return normalize(raw) if raw is not None else None
+
+
+def _parse_bytes(data: bytes) -> pd.DataFrame | None:
+    return parse_workbook(io.BytesIO(data))
+
+
+def parse_workbooks(data: dict, workers: int | None = None):
+    """Parse several workbooks in worker processes.
+
+    *data* maps a key to the raw bytes of a workbook. Yields ``(key, frame)``
+    pairs as soon as each file is done. Workers are forked where possible:
+    under ``streamlit run`` the ``__main__`` module is the page script, which
+    spawned workers would execute again.
+    """
+    workers = min(len(data), workers or os.cpu_count() or 1)
+    ctx = get_context("fork") if "fork" in get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+        futures = {ex.submit(_parse_bytes, b): key for key, b in data.items()}
+        for fut in as_completed(futures):
+            yield futures[fut], fut.result()
+
+
+def combine(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate normalised exports, reconcile their dtypes and restore the day order.
+
+    Within a day the rows keep the order of *frames*, then of each export.
+    """
+    df = pd.concat(frames, ignore_index=True).infer_objects()
+    df = df.sort_values('Date de réalisation', kind='stable', key=lambda s: s.dt.normalize(), ignore_index=True)
+    return arrow_compatible(compact(df))
+
+
+def snapshot_key(data: bytes) -> str:
+    """Return the content hash identifying an uploaded workbook."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def dataset_key(keys) -> str:
+    """Return the key of the dataset made of the workbooks hashed to *keys*."""
+    return keys[0] if len(keys) == 1 else snapshot_key("".join(keys).encode())
+
+
+def load_files(paths, workers: int | None = None) -> tuple[str, pd.DataFrame | None]:
+    """Load the exports at *paths* as the main page does, outside of Streamlit.
+
+    Snapshots are read and written the same way, so the app and this function
+    share them. Returns the dataset key and the combined frame, ``None`` when
+    no file is conform; non-conform files are skipped.
+    """
+    blobs = [Path(p).read_bytes() for p in paths]
+    keys = [snapshot_key(b) for b in blobs]
+    frames = {k: load_snapshot(k) for k in keys}
+    todo = {k: b for k, b in zip(keys, blobs) if frames[k] is None}
+    parsed = [(k, _parse_bytes(b)) for k, b in todo.items()] if len(todo) <= 1 else parse_workbooks(todo, workers)
+    for k, o in parsed:
+        frames[k] = o
+        if o is not None:
+            save_snapshot(k, o)
+    parts = [frames[k] for k in keys if frames[k] is not None]
+    if not parts:
+        return dataset_key(keys), None
+    return dataset_key(keys), parts[0] if len(parts) == 1 else combine(parts)
+
+
+def _snapshot_path(key: str, root: Path = SNAPSHOTS) -> Path:
+    return Path(root) / f"{key}-v{SNAPSHOT_VERSION}.arrow"
+
+
+def arrow_compatible(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast mixed-type object columns to strings so *df* can be stored as Arrow.
+
+    Excel exports often mix numbers and text in free-text columns, which Arrow
+    refuses to serialise. The frame is modified in place and returned.
+    """
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True).startswith("mixed"):
+            df[col] = s.where(s.isna(), s.astype(str))
+    return df
+
+
+def load_snapshot(key: str, root: Path = SNAPSHOTS) -> pd.DataFrame | None:
+    """Return the snapshot stored for *key* under *root*, or ``None`` if there is none."""
+    path = _snapshot_path(key, root)
+    if not path.exists():
+        return None
+    import pyarrow.feather as feather
+
+    try:
+        return feather.read_table(path, memory_map=True).to_pandas()
+    except Exception:
+        return None
+
+
+def save_snapshot(key: str, df: pd.DataFrame, root: Path = SNAPSHOTS) -> None:
+    """Store *df* under *root* as an uncompressed Arrow file so it can be memory-mapped."""
+    import pyarrow.feather as feather
+
+    path = _snapshot_path(key, root)
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        feather.write_feather(df, tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    except Exception:
+        tmp.unlink(missing_ok=True)
@@ -0,0 +1,185 @@
+"""Choropleth maps of Paris arrondissements and communes, independent from Streamlit."""
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from ingest import ROOT, _n
+
+GEO = ROOT / "arrondissements.geojson"
+# Départements around Paris whose communes are drawn on the commune maps.
+DEPARTEMENTS = ("92", "93", "94")
+
+PARIS = {"lat": 48.8566, "lon": 2.3522}
+# Tolerance of the simplification and precision kept for the coordinates, in
+# degrees: about 10 m and 1 m in Paris, below what a dashboard map shows.
+TOLERANCE = 1e-4
+DECIMALS = 5
+
+# Commune labels of Paris rows, mapped to the INSEE code of their arrondissement.
+PARIS_ARR = re.compile(r"PARIS\s*(\d{1,2})")
+
+BLUE = ((0, "#E6F0FF"), (1, "#2C75FF"))
+GREEN = ((0, "#E6F0FF"), (1, "#75C700"))
+
+
+def _simplify_ring(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return *points* simplified with the Douglas-Peucker algorithm."""
+    if len(points) <= 4:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = points[i], points[j]
+        seg = b - a
+        rel = points[i + 1:j] - a
+        norm = np.hypot(*seg)
+        if norm == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / norm
+        k = int(dist.argmax())
+        if dist[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+    out = points[keep]
+    return out if len(out) >= 4 else points
+
+
+def simplify_geojson(geojson: dict, key: str = "c_ar", tolerance: float = TOLERANCE) -> dict:
+    """Return a lighter copy of *geojson* for maps.
+
+    Rings are simplified, coordinates are rounded and each feature only keeps
+    its *key* property, exposed as the feature ``id``.
+    """
+    features = []
+    for f in geojson.get("features", []):
+        geom = f["geometry"]
+        polygons = geom["coordinates"] if geom["type"] == "MultiPolygon" else [geom["coordinates"]]
+        polygons = [
+            [np.round(_simplify_ring(np.asarray(ring, dtype=float), tolerance), DECIMALS).tolist() for ring in poly]
+            for poly in polygons
+        ]
+        features.append({
+            "type": "Feature",
+            "id": f["properties"][key],
+            "properties": {},
+            "geometry": {
+                "type": geom["type"],
+                "coordinates": polygons if geom["type"] == "MultiPolygon" else polygons[0],
+            },
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def communes_path(dep: str) -> Path:
+    """Return the file holding the communes GeoJSON of the département *dep*."""
+    return ROOT / f"communes_{dep}.geojson"
+
+
+def choropleth(geojson: dict, locations, values, customdata=None, hovertemplate=None, title=None, colorscale=BLUE) -> go.Figure:
+    """Return the map of *geojson* showing *values* at *locations*.
+
+    *geojson* is shared with the figure rather than copied, so the geometry
+    simplified once by :func:`simplify_geojson` serves every map; only the
+    per-area arrays change between two maps.
+    """
+    fig = go.Figure(go.Choropleth(
+        locations=np.asarray(locations).tolist(),
+        z=np.asarray(values, dtype=float).tolist(),
+        customdata=None if customdata is None else np.asarray(customdata).tolist(),
+        hovertemplate=None if hovertemplate is None else hovertemplate + "<extra></extra>",
+        colorscale=[list(c) for c in colorscale],
+        marker_line_width=0.5,
+        colorbar_thickness=15,
+    ))
+    # Plotly deep-copies a geometry given to the trace before it joins the
+    # figure; set afterwards, the trace keeps a reference to it.
+    fig.data[0].geojson = geojson
+    fig.update_geos(fitbounds="locations", visible=False, center=PARIS)
+    fig.update_layout(margin={"l": 0, "r": 0, "t": 40, "b": 0}, title=title)
+    return fig
+
+
+def commune_key(name) -> str:
+    """Return the normalised form of a commune name used for lookups."""
+    key = re.sub(r"cedex\s*\d*", "", _n(name))
+    return re.sub(r"[^a-z0-9]", "", key)
+
+
+def commune_geojson(arrondissements: dict | None, departements: list[dict]) -> dict:
+    """Merge the Paris arrondissements and the communes of *departements*.
+
+    Every feature gets a ``code`` (INSEE code, per arrondissement for Paris)
+    and a ``nom`` property; the Paris commune itself is replaced by its
+    arrondissements.
+    """
+    features = []
+    for f in (arrondissements or {}).get("features", []):
+        p = f["properties"]
+        features.append({**f, "properties": {"code": str(p["c_arinsee"]), "nom": p.get("l_ar") or p.get("l_aroff")}})
+    for gj in departements:
+        for f in gj.get("features", []):
+            p = f["properties"]
+            if p["code"] != "75056":
+                features.append({**f, "properties": {"code": str(p["code"]), "nom": p["nom"]}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _centroid(ring) -> tuple[float, float]:
+    x, y = np.asarray(ring, dtype=float).T
+    cross = x * np.roll(y, -1) - np.roll(x, -1) * y
+    area = cross.sum() / 2
+    if area == 0:
+        return float(x.mean()), float(y.mean())
+    return float(((x + np.roll(x, -1)) * cross).sum() / (6 * area)), float(((y + np.roll(y, -1)) * cross).sum() / (6 * area))
+
+
+def commune_table(geojson: dict) -> pd.DataFrame:
+    """Return the code, name, lookup key and centroid of every commune of *geojson*.
+
+    The centroid is the one of the largest outer ring of the commune.
+    """
+    rows = []
+    for f in geojson.get("features", []):
+        geom = f["geometry"]
+        polygons = geom["coordinates"] if geom["type"] == "MultiPolygon" else [geom["coordinates"]]
+        lon, lat = _centroid(max((poly[0] for poly in polygons), key=len))
+        p = f["properties"]
+        rows.append((p["code"], p["nom"], commune_key(p["nom"]), lat, lon))
+    return pd.DataFrame(rows, columns=["code", "nom", "cle", "lat", "lon"])
+
+
+def commune_codes(names, lookup: dict) -> np.ndarray:
+    """Return the INSEE code of each of *names*, or ``None`` if it is unknown.
+
+    Paris labels resolve to their arrondissement, the others through
+    *lookup*, which maps :func:`commune_key` to codes. Call it on distinct
+    names only: the cost grows with the number of names.
+    """
+    out = []
+    for name in names:
+        m = PARIS_ARR.search(str(name).upper())
+        out.append(f"751{int(m.group(1)):02d}" if m else lookup.get(commune_key(name)))
+    return np.asarray(out, dtype=object)
+
+
+def commune_counts(counts: pd.Series, table: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    """Return the intervention counts per commune code and the unplaced count.
+
+    *counts* is indexed by the commune labels of the data, as returned by
+    :func:`engine.counts`; the labels are mapped once each and the counts
+    are summed per code.
+    """
+    codes = commune_codes(counts.index, dict(zip(table["cle"], table["code"])))
+    known = pd.notna(codes)
+    out = pd.DataFrame({"code": codes[known], "n": counts.to_numpy()[known]}).groupby("code", as_index=False)["n"].sum()
+    out = out.merge(table[["code", "nom"]], on="code", how="left")
+    return out, int(counts.to_numpy()[~known].sum())
@@ -2,11 +2,18 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 
-from app_utils import build_interventions, get_geojson
+from app_utils import build_interventions, cached, date_bounds, export_button, get_base_map, paged_table, profiler
+from engine import KeyIndex, counts, daily_counts, date_slice, resample_counts
+from maps import choropleth
 
 ENEDIS_COLORS = ["#2C75FF", "#75C700", "#4A9BFF", "#A0D87C", "#0072F0", "#47B361", "#6EABFF", "#9EE08E"]
+# Number of PRM offered by the search box at a time.
+PRM_MATCHES = 50
+# Hover label of a bar of the timeline, per resampling unit.
+HOVER_DATES = {"jour": "%{x|%d/%m/%Y}", "semaine": "Semaine du %{x|%d/%m/%Y}", "mois": "%{x|%m/%Y}"}
 
 st.set_page_config(page_title="Analyse détaillée PRM", layout="wide")
+prof = profiler("analyse_prm_detaillee")
 
 if "data" not in st.session_state:
     st.warning("Merci de d'abord charger un fichier via la page principale.")
@@ -19,44 +26,43 @@ def _params(*args):
     return tuple(args)
 
 
-@st.cache_data(show_spinner=False)
-def _available_prm(interventions: pd.DataFrame) -> list[str]:
-    """Return sorted unique PRM identifiers."""
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _interventions(key: str, _df: pd.DataFrame) -> pd.DataFrame:
+    """Return the deduplicated interventions of the loaded dataset."""
 
-    return sorted(interventions["PRM_clean"].dropna().unique())
+    return build_interventions(_df)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _prm_index(key: str, _interventions: pd.DataFrame) -> KeyIndex:
+    """Return the row positions of every PRM of the loaded dataset."""
+
+    return KeyIndex(_interventions["PRM_clean"])
 
 
-@st.cache_data(show_spinner=False)
 def _filter_prm(
-    interventions: pd.DataFrame, prm: str, date_start, date_end, params: tuple
+    interventions: pd.DataFrame, index: KeyIndex, prm: str, date_start, date_end
 ) -> pd.DataFrame:
-    """Filter interventions for a PRM and date range."""
-
-    flt = interventions[interventions["PRM_clean"].eq(prm)].copy()
-    if "Date_intervention" in flt.columns:
-        flt["Date_intervention"] = pd.to_datetime(flt["Date_intervention"])
-        flt = flt[
-            (flt["Date_intervention"] >= pd.to_datetime(date_start))
-            & (flt["Date_intervention"] <= pd.to_datetime(date_end))
-        ]
-    return flt
-
-
-@st.cache_data(show_spinner=False)
-def _daily_volume(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
-    """Return number of interventions per day."""
-
-    vol = (
-        flt.groupby(flt["Date_intervention"].dt.date)
-        .size()
-        .rename_axis("Date")
-        .reset_index(name="Interventions")
-    )
-    vol["Date"] = pd.to_datetime(vol["Date"])
-    return vol
+    """Filter interventions for a PRM and date range.
+
+    The rows of the PRM are read from the index and are sorted by date, so the
+    range is resolved to a slice of them: the cost only depends on the number
+    of interventions of the PRM.
+    """
+
+    part = interventions.take(index.rows(prm))
+    return part.iloc[date_slice(part["Date_intervention"].to_numpy(), date_start, date_end)]
+
+
+@cached
+def _volume(flt: pd.DataFrame, params: tuple) -> tuple[pd.DataFrame, str]:
+    """Return number of interventions per day, week or month, and the unit used."""
 
+    vol, unit = resample_counts(daily_counts(flt["Date_intervention"]))
+    return vol.rename(columns={"n": "Interventions"}), unit
 
-@st.cache_data(show_spinner=False)
+
+@cached
 def _duration_stats(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
     """Return per-intervention durations for visualization."""
 
@@ -80,7 +86,7 @@ def _duration_stats(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
     return dur
 
 
-@st.cache_data(show_spinner=False)
+@cached
 def _arr_stats(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
     """Return interventions count by arrondissement with percentages."""
 
@@ -93,20 +99,31 @@ def _arr_stats(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
 
 
 df = st.session_state["data"]
-interventions = build_interventions(df)
+interventions = _interventions(st.session_state["data_key"], df)
 
 if "PRM_clean" not in interventions.columns:
     st.warning("La colonne PRM est manquante ou invalide dans les données chargées.")
     st.stop()
 
-prm_options = _available_prm(interventions)
-if not prm_options:
+index = _prm_index(st.session_state["data_key"], interventions)
+prof.lap("Index des PRM")
+if not len(index):
     st.warning("Aucun PRM disponible dans les données filtrées.")
     st.stop()
 
 min_date = pd.to_datetime(interventions["Date_intervention"].min())
 max_date = pd.to_datetime(interventions["Date_intervention"].max())
 
+query = st.sidebar.text_input("Rechercher un PRM", placeholder="Début du numéro").strip()
+prm_options = index.search(query, PRM_MATCHES)
+prof.lap("Recherche")
+if not prm_options:
+    st.sidebar.warning(f"Aucun PRM ne commence par « {query} ».")
+    st.stop()
+matches = index.count(query)
+if matches > len(prm_options):
+    st.sidebar.caption(f"{len(prm_options)} premiers PRM sur {matches:,} : précisez la recherche.".replace(",", " "))
+
 with st.sidebar.form("prm_filters"):
     prm = st.selectbox("PRM", prm_options)
     date_range = st.date_input(
@@ -120,18 +137,10 @@ with st.sidebar.form("prm_filters"):
 if not ok:
     st.stop()
 
-if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
-    start_date, end_date = date_range
-else:  # fallback when a single date is returned
-    start_date = end_date = date_range
+start_date, end_date = date_bounds(date_range)
 
-flt = _filter_prm(
-    interventions,
-    prm,
-    start_date,
-    end_date,
-    _params(prm, start_date, end_date),
-)
+flt = _filter_prm(interventions, index, prm, start_date, end_date)
+prof.lap("Filtres")
 
 if flt.empty:
     st.warning("Aucune intervention pour ce PRM sur la période sélectionnée.")
@@ -161,24 +170,23 @@ with st.expander("Intervenants"):
     )
 
 # Graphique 1 : chronologie des interventions
-volume_jour = _daily_volume(
+volume, unit = _volume(
     flt,
     _params(prm, start_date, end_date),
 )
 fig_volume = px.bar(
-    volume_jour,
+    volume,
     x="Date",
     y="Interventions",
     title="Chronologie des interventions",
     color_discrete_sequence=ENEDIS_COLORS,
 )
-fig_volume.update_traces(hovertemplate="%{x|%d/%m/%Y}<br>%{y} interventions")
+fig_volume.update_traces(hovertemplate=HOVER_DATES[unit] + "<br>%{y} interventions")
 st.plotly_chart(fig_volume, use_container_width=True)
+prof.lap("Chronologie des interventions")
 
 # Graphique 2 : répartition par équipe
-team_counts = (
-    flt["Equipe"].value_counts().rename_axis("Equipe").reset_index(name="Interventions")
-)
+team_counts = counts(flt["Equipe"]).reset_index(name="Interventions")
 fig_team = px.bar(
     team_counts,
     x="Interventions",
@@ -190,6 +198,7 @@ fig_team = px.bar(
 )
 fig_team.update_layout(yaxis_categoryorder="total ascending")
 st.plotly_chart(fig_team, use_container_width=True)
+prof.lap("Poids des équipes mobilisées")
 
 # Graphique 3 : temps réalisé vs théorique
 if {"Temps réalisé", "Temps théorique"}.issubset(flt.columns):
@@ -206,6 +215,7 @@ if {"Temps réalisé", "Temps théorique"}.issubset(flt.columns):
         color_discrete_sequence=ENEDIS_COLORS[:2],
     )
     st.plotly_chart(fig_temps, use_container_width=True)
+    prof.lap("Durées réalisées vs théoriques (statistiques descriptives)")
 else:
     st.info("Durées théoriques/réalisées indisponibles pour ce PRM.")
 
@@ -214,22 +224,18 @@ arr = _arr_stats(
     flt,
     _params(prm, start_date, end_date),
 )
-geojson = get_geojson()
-if not arr.empty and geojson:
-    fig_map = px.choropleth(
-        arr,
-        geojson=geojson,
-        locations="Arr",
-        color="pct",
-        featureidkey="properties.c_ar",
-        color_continuous_scale=[[0, "#E6F0FF"], [1, "#2C75FF"]],
-        hover_data={"n": True, "pct": ":.1f"},
-        center={"lat": 48.8566, "lon": 2.3522},
+base_map = get_base_map()
+if not arr.empty and base_map:
+    fig_map = choropleth(
+        base_map,
+        arr["Arr"],
+        arr["pct"],
+        arr[["n"]],
+        hovertemplate="Arr %{location}<br>%{customdata[0]} interventions<br>%{z:.1f}%",
         title="Répartition géographique des interventions",
     )
-    fig_map.update_geos(fitbounds="locations", visible=False)
-    fig_map.update_traces(hovertemplate="Arr %{location}<br>%{customdata[0]} interventions<br>%{customdata[1]:.1f}%")
     st.plotly_chart(fig_map, use_container_width=True)
+    prof.lap("Répartition géographique des interventions")
 else:
     st.info("Aucun arrondissement disponible pour cartographier ce PRM.")
 
@@ -253,8 +259,11 @@ if not per_intervention.empty:
         hovertemplate="%{x|%d/%m/%Y}<br>%{y:.1f} min<br>%{customdata[0]}"
     )
     st.plotly_chart(fig_durations, use_container_width=True)
+    prof.lap("Évolution des durées par intervention")
 else:
     st.info("Durées d'intervention non disponibles pour ce PRM.")
 
 st.subheader("Données filtrées")
-st.dataframe(flt)
+paged_table(flt, key="prm")
+export_button(flt, name=f"interventions_prm_{prm}")
+prof.lap("Tableau")
@@ -0,0 +1,101 @@
+import streamlit as st
+import pandas as pd
+from app_utils import cached, get_index, get_store, build_interventions, date_bounds, export_button, profiler
+from engine import agent_kpis, percentile_ranks
+from store import scope_of
+
+st.set_page_config(page_title="Classement des techniciens", layout="wide")
+prof = profiler("classement_techniciens")
+
+if "data" not in st.session_state:
+    st.warning("Merci de d'abord charger un fichier via la page principale.")
+    st.stop()
+
+
+@cached
+def _kpis(df: pd.DataFrame, selection: dict, start, end) -> pd.DataFrame:
+    """Return the indicators of every technician for the filters, from the store without filters."""
+    index = get_index(st.session_state["data_key"], df)
+    store = get_store(st.session_state["data_key"])
+    if store is not None and scope_of(index, selection, start, end) == ("all", None):
+        kpis = store.frame("kpis")
+        if kpis is not None:
+            return kpis
+    return agent_kpis(build_interventions(df.take(index.rows(selection, start, end))))
+
+
+df = st.session_state["data"]
+index = get_index(st.session_state["data_key"], df)
+
+if "Agent" not in df.columns:
+    st.warning("La colonne Agent est manquante dans les données chargées.")
+    st.stop()
+
+years = index.values("Année")
+months = list(range(1, 13))
+days = list(range(1, 32))
+agences = index.values("Agence")
+prestations = index.values("Prestation")
+uos = index.values("Code et libelle Uo")
+statuts = index.values("Statut de l'intervention")
+etats = index.values("Etat de réalisation")
+period = index.date_range
+
+with st.sidebar.form("filtres_classement"):
+    per = st.date_input("Période", value=period, min_value=period[0], max_value=period[1])
+    y = st.multiselect("Années", years, years)
+    m = st.multiselect("Mois", months, months, format_func=lambda x: f"{x:02d}")
+    d = st.multiselect("Jours", days, days, format_func=lambda x: f"{x:02d}")
+    agc_sel = st.multiselect("Agence", agences, agences)
+    pr = st.multiselect("Prestation", prestations, prestations)
+    uo_sel = st.multiselect("UO", uos, uos)
+    st_sel = st.multiselect("Statut", statuts, statuts)
+    et_sel = st.multiselect("État", etats, etats)
+    min_n = st.number_input("Interventions minimum", min_value=1, value=1, step=10)
+    ok = st.form_submit_button("Appliquer")
+prof.lap("Barre latérale")
+
+if not ok:
+    st.stop()
+
+selection = {
+    "Année": y,
+    "Mois": m,
+    "Jour": d,
+    "Prestation": pr if prestations else None,
+    "Code et libelle Uo": uo_sel if uos else None,
+    "Statut de l'intervention": st_sel if statuts else None,
+    "Etat de réalisation": et_sel if etats else None,
+    "Agence": agc_sel if agences else None,
+}
+start, end = date_bounds(per)
+kpis = _kpis(df, selection, start, end)
+prof.lap("Indicateurs")
+kpis = kpis[kpis["Interventions"] >= min_n]
+
+if kpis.empty:
+    st.warning("Aucun technicien selon les critères définis.")
+    st.stop()
+
+st.title("Classement des techniciens")
+st.caption(
+    f"{len(kpis)} techniciens classés. Chaque percentile indique la part de la flotte "
+    "que le technicien égale ou dépasse sur l'indicateur (100 = meilleur)."
+)
+
+ranks = percentile_ranks(kpis)
+board = kpis.join(ranks.add_prefix("Pct "))
+board.insert(0, "Score", ranks.mean(axis=1).round(1))
+board = board.sort_values("Score", ascending=False).reset_index()
+prof.lap("Classement")
+
+config = {
+    f"Pct {col}": st.column_config.ProgressColumn(f"Pct {col}", min_value=0, max_value=100, format="%.0f")
+    for col in ranks.columns
+}
+for col in kpis.columns:
+    if kpis[col].dtype.kind == "f":
+        config[col] = st.column_config.NumberColumn(col, format="%.1f")
+st.dataframe(board, hide_index=True, use_container_width=True, column_config=config)
+export_button(board, columns=None, name="classement_techniciens")
+prof.lap("Tableau")
@@ -1,36 +1,67 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from app_utils import get_geojson, build_interventions
+import plotly.graph_objects as go
+from app_utils import cached, get_base_map, get_index, get_store, build_interventions, date_bounds, export_button, paged_table, profiler
+from engine import MATRIX_DIMS, TIMES, agent_matrix, month_ids, monthly_bands
+from maps import GREEN, choropleth
+from store import scope_of
 
 ENEDIS_COLORS = ["#2C75FF", "#75C700", "#4A9BFF", "#A0D87C", "#0072F0", "#47B361", "#6EABFF", "#9EE08E"]
 
 st.set_page_config(page_title="Statistiques comparatives", layout="wide")
+prof = profiler("statistiques_comparatives")
 
 if "data" not in st.session_state:
     st.warning("Merci de d'abord charger un fichier via la page principale.")
     st.stop()
 
+
+@cached
+def _fleet_matrix(df: pd.DataFrame, selection: dict, start, end) -> pd.DataFrame:
+    """Return the agent x category matrix of every technician for the filters.
+
+    The matrix does not depend on the technicians picked, so switching
+    technician only reads other rows of it. Without filters, it is read
+    from the precomputed store when there is one.
+    """
+    index = get_index(st.session_state["data_key"], df)
+    store = get_store(st.session_state["data_key"])
+    if store is not None and scope_of(index, selection, start, end) == ("all", None):
+        matrix = store.frame("matrix")
+        if matrix is not None:
+            return matrix
+    fleet = build_interventions(df.take(index.rows(selection, start, end)))
+    if {"Année", "Mois"}.issubset(fleet.columns):
+        fleet = fleet.assign(Période=month_ids(fleet))
+    return agent_matrix(fleet, MATRIX_DIMS)
+
+
 df = st.session_state["data"]
+index = get_index(st.session_state["data_key"], df)
 
 
-years = sorted(df["Année"].unique())
+years = index.values("Année")
 months = list(range(1, 13))
 days = list(range(1, 32))
-techs = sorted(df["Agent"].dropna().unique()) if "Agent" in df.columns else []
-agences = sorted(df["Agence"].dropna().unique()) if "Agence" in df.columns else []
-prestations = sorted(df["Prestation"].dropna().unique()) if "Prestation" in df.columns else []
-uos = sorted(df["Code et libelle Uo"].dropna().unique()) if "Code et libelle Uo" in df.columns else []
-statuts = sorted(df["Statut de l'intervention"].dropna().unique()) if "Statut de l'intervention" in df.columns else []
-etats = sorted(df["Etat de réalisation"].dropna().unique()) if "Etat de réalisation" in df.columns else []
+techs = index.values("Agent")
+agences = index.values("Agence")
+prestations = index.values("Prestation")
+uos = index.values("Code et libelle Uo")
+statuts = index.values("Statut de l'intervention")
+etats = index.values("Etat de réalisation")
 
 # Liste par defaut des techniciens a comparer
 default_agents = ["CICIO Florin","DJABELKHIR Mohammed","MAILLARD Yoann","RONCERAY Florian","PEINADO BENITO Augustin","DANSOKO Toumany","GRANDEMANGE Gary","PAYET Vincent","VAUSSOUE Jean-françois","MARC Radjoucoumar","KONE Gaoussou","TRINH Quang","ABRANTES FELIZARDO Artur","KESSI Farid","TRARI Nasr eddine","CASTELLI Stéfano","DIANIFABA Ibrahima","AHAMADA Nazir","BOUJATLA Samir","MUZAMA NDANGU Landry","BROUILLARD Geoffroy","DJABRI Gabrielle","EXILUS Marc","KONGA Chris","SANTAT Eric","LAPITRE Jean-philippe","LARNICOL Lucas","DJABELKHIR Mohamed","DAAOU Yassine","DALAOUI Jeber","LOUBAKI CYS Francel","VACQUER Andre"]
 default_agents_in_data = [a for a in default_agents if a in techs] or techs
 
+period = index.date_range
+
 with st.sidebar.form("filtres_comp"):
     tech = st.selectbox("Technicien", techs)
     comp_list = st.multiselect("Technicien à comparer", techs, default=default_agents_in_data)
+    per = st.date_input("Période", value=period, min_value=period[0], max_value=period[1])
     y = st.multiselect("Années", years, years)
     m = st.multiselect("Mois", months, months, format_func=lambda x: f"{x:02d}")
     d = st.multiselect("Jours", days, days, format_func=lambda x: f"{x:02d}")
@@ -40,75 +71,57 @@ with st.sidebar.form("filtres_comp"):
     st_sel = st.multiselect("Statut", statuts, statuts)
     et_sel = st.multiselect("État", etats, etats)
     ok = st.form_submit_button("Appliquer")
+prof.lap("Barre latérale")
 
 if not ok:
     st.stop()
 
-flt = df[
-    df["Année"].isin(y)
-    & df["Mois"].isin(m)
-    & df["Jour"].isin(d)
-    & df["Agent"].eq(tech)
-]
-if prestations:
-    flt = flt[flt["Prestation"].isin(pr)]
-if uos:
-    flt = flt[flt["Code et libelle Uo"].isin(uo_sel)]
-if statuts:
-    flt = flt[flt["Statut de l'intervention"].isin(st_sel)]
-if etats:
-    flt = flt[flt["Etat de réalisation"].isin(et_sel)]
-if agences:
-    flt = flt[flt["Agence"].isin(agc_sel)]
-
-comp = df[
-    df["Année"].isin(y)
-    & df["Mois"].isin(m)
-    & df["Jour"].isin(d)
-    & df["Agent"].isin(comp_list)
-]
-if prestations:
-    comp = comp[comp["Prestation"].isin(pr)]
-if uos:
-    comp = comp[comp["Code et libelle Uo"].isin(uo_sel)]
-if statuts:
-    comp = comp[comp["Statut de l'intervention"].isin(st_sel)]
-if etats:
-    comp = comp[comp["Etat de réalisation"].isin(et_sel)]
-if agences:
-    comp = comp[comp["Agence"].isin(agc_sel)]
-
-if flt.empty or comp.empty:
-    st.warning("Aucune donnée pour ce technicien ou la comparaison.")
+selection = {
+    "Année": y,
+    "Mois": m,
+    "Jour": d,
+    "Prestation": pr if prestations else None,
+    "Code et libelle Uo": uo_sel if uos else None,
+    "Statut de l'intervention": st_sel if statuts else None,
+    "Etat de réalisation": et_sel if etats else None,
+    "Agence": agc_sel if agences else None,
+}
+start, end = date_bounds(per)
+matrix = _fleet_matrix(df, selection, start, end)
+prof.lap("Matrice de la flotte")
+totals = matrix["total"]
+active = totals.index[totals["n"] > 0]
+comp_agents = active.intersection(comp_list)
+
+if tech not in active or comp_agents.empty:
+    st.warning("Aucune intervention pour ce technicien ou la comparaison.")
     st.stop()
 
-interventions_tech = build_interventions(flt)
-interventions_comp = build_interventions(comp)
-
-if interventions_tech.empty or interventions_comp.empty:
-    st.warning("Aucune intervention selon les critères définis.")
-    st.stop()
+interventions_tech = build_interventions(df.take(index.rows({**selection, "Agent": [tech]}, start, end)))
+prof.lap("build_interventions")
 
 st.title(f"Statistiques comparatives – {tech}")
 
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Interventions technicien", len(interventions_tech))
-n_comp_agents = interventions_comp["Agent"].nunique() or 1
+c1.metric("Interventions technicien", int(totals.at[tech, "n"]))
 c2.metric(
     "Interventions comparées (moyenne)",
-    f"{len(interventions_comp) / n_comp_agents:.1f}"
+    f"{totals.loc[comp_agents, 'n'].mean():.1f}"
 )
-if "Temps réalisé" in interventions_tech.columns:
-    c3.metric("Durée moyenne tech", f"{interventions_tech['Temps réalisé'].mean():.1f}")
-    c4.metric("Durée moyenne comp", f"{interventions_comp['Temps réalisé'].mean():.1f}")
+if "realise_sum" in totals.columns:
+    c3.metric("Durée moyenne tech", f"{totals.at[tech, 'realise_sum'] / totals.at[tech, 'realise_n']:.1f}")
+    comp_tot = totals.loc[comp_agents].sum()
+    c4.metric("Durée moyenne comp", f"{comp_tot['realise_sum'] / comp_tot['realise_n']:.1f}")
 
 # Fonctions utilitaires
 
-def _comp_counts(d1: pd.DataFrame, d2: pd.DataFrame, col: str, n: int | None = None, sort: bool = False) -> pd.DataFrame:
-    vc1 = d1[col].value_counts()
-    n_agents = d2["Agent"].nunique() if "Agent" in d2.columns else 1
-    vc2 = d2[col].value_counts() / n_agents
+def _comp_counts(col: str, n: int | None = None, sort: bool = False) -> pd.DataFrame:
+    """Return the counts of *col* for the technician and the mean of the compared agents."""
+    block = matrix[col]
+    vc1 = block.loc[tech]
+    vc2 = block.loc[comp_agents].mean()
     tot = (vc1 + vc2)
+    tot = tot[tot > 0]
     if sort:
         tot = tot.sort_index()
     else:
@@ -123,47 +136,33 @@ def _comp_counts(d1: pd.DataFrame, d2: pd.DataFrame, col: str, n: int | None = N
     })
 
 # Volume annuel comparé
-va = _comp_counts(interventions_tech, interventions_comp, "Année", sort=True)
+va = _comp_counts("Année", sort=True)
 fig = px.bar(va, x="Année", y=["Technicien", "Comparaison"], barmode="group", color_discrete_sequence=ENEDIS_COLORS[:2], title="Volume annuel comparé")
 st.plotly_chart(fig, use_container_width=True)
-
-# Volume mensuel comparé (reprend l'ancien graphique)
-if {"Agent"}.issubset(df.columns):
-    grp = interventions_comp.groupby(["Année", "Mois", "Mois_nom", "Agent"]).size().reset_index(name="Interventions")
-    months_df = grp[["Année", "Mois", "Mois_nom"]].drop_duplicates()
-    tech_df = grp[grp["Agent"] == tech][["Année", "Mois", "Mois_nom", "Interventions"]].rename(columns={"Interventions": "tech"})
-    merged = months_df.merge(tech_df, on=["Année", "Mois", "Mois_nom"], how="left")
-    idx = grp.groupby(["Année", "Mois", "Mois_nom"])["Interventions"].idxmax()
-    max_df = grp.loc[idx, ["Année", "Mois", "Mois_nom", "Agent", "Interventions"]].rename(columns={"Interventions": "max", "Agent": "agent_max"})
-    merged = merged.merge(max_df, on=["Année", "Mois", "Mois_nom"], how="left")
-    nz = grp[grp["Interventions"] > 0]
-    idx = nz.groupby(["Année", "Mois", "Mois_nom"])["Interventions"].idxmin()
-    min_df = nz.loc[idx, ["Année", "Mois", "Mois_nom", "Agent", "Interventions"]].rename(columns={"Interventions": "min", "Agent": "agent_min"})
-    merged = merged.merge(min_df, on=["Année", "Mois", "Mois_nom"], how="left")
-    mean_df = grp.groupby(["Année", "Mois", "Mois_nom"])["Interventions"].mean().reset_index(name="moyenne")
-    merged = merged.merge(mean_df, on=["Année", "Mois", "Mois_nom"], how="left")
-    merged["Date"] = pd.to_datetime(dict(year=merged["Année"], month=merged["Mois"], day=1))
-    for col in ["tech", "max", "min", "moyenne", "agent_max", "agent_min"]:
-        if col not in merged.columns:
-            merged[col] = pd.NA
-    lines = []
-    for metric in ["tech", "max", "min", "moyenne"]:
-        tmp = merged[["Date", metric]].copy()
-        tmp["Metric"] = metric
-        if metric == "tech":
-            tmp["Agent"] = tech
-        elif metric == "max":
-            tmp["Agent"] = merged["agent_max"]
-        elif metric == "min":
-            tmp["Agent"] = merged["agent_min"]
-        else:
-            tmp["Agent"] = ""
-        tmp = tmp.rename(columns={metric: "Interventions"})
-        lines.append(tmp)
-    lines = pd.concat(lines, ignore_index=True)
-    fig2 = px.line(lines, x="Date", y="Interventions", color="Metric", markers=True, color_discrete_sequence=ENEDIS_COLORS[:4], title="Volume mensuel comparé", hover_data={"Agent": True})
-    fig2.update_traces(hovertemplate="%{x|%Y-%m}<br>%{customdata[0]}<br>%{y} interventions")
+prof.lap("Volume annuel comparé")
+
+# Volume mensuel comparé : les agents sans activité un mois comptent pour zéro
+if "Période" in matrix.columns:
+    bands = monthly_bands(matrix["Période"], tech, comp_agents)
+    fig2 = go.Figure()
+    fig2.add_scatter(x=bands["Date"], y=bands["q75"], mode="lines", line_width=0, showlegend=False, hoverinfo="skip")
+    fig2.add_scatter(
+        x=bands["Date"], y=bands["q25"], mode="lines", line_width=0, fill="tonexty",
+        fillcolor="rgba(44, 117, 255, 0.15)", name="quartiles", hoverinfo="skip",
+    )
+    for metric, agent, color in zip(
+        ["tech", "max", "min", "moyenne"],
+        [tech, bands["agent_max"], bands["agent_min"], ""],
+        ENEDIS_COLORS[:4],
+    ):
+        fig2.add_scatter(
+            x=bands["Date"], y=bands[metric], mode="lines+markers", name=metric, line_color=color,
+            customdata=np.broadcast_to(np.asarray(agent, dtype=object), len(bands)),
+            hovertemplate="%{x|%Y-%m}<br>%{customdata}<br>%{y:.0f} interventions",
+        )
+    fig2.update_layout(title="Volume mensuel comparé", xaxis_title="Date", yaxis_title="Interventions", legend_title="Metric")
     st.plotly_chart(fig2, use_container_width=True)
+    prof.lap("Volume mensuel comparé")
 
 # Graphiques comparatifs supplementaires
 bar_cols = [
@@ -177,52 +176,46 @@ bar_cols = [
 ]
 
 for col, title in bar_cols:
-    if col in interventions_tech.columns:
-        t = _comp_counts(interventions_tech, interventions_comp, col, n=10)
+    if col in matrix.columns:
+        t = _comp_counts(col, n=10)
         fig = px.bar(t, x=col, y=["Technicien", "Comparaison"], barmode="group", color_discrete_sequence=ENEDIS_COLORS[:2], title=title)
         st.plotly_chart(fig, use_container_width=True)
-
-if {"Temps théorique", "Temps réalisé", "Prestation"}.issubset(interventions_tech.columns):
-    tech_temps = interventions_tech.groupby("Prestation")[["Temps théorique", "Temps réalisé"]].mean().reset_index()
-    comp_temps = interventions_comp.groupby("Prestation")[["Temps théorique", "Temps réalisé"]].mean().reset_index()
-    tmp = pd.merge(tech_temps, comp_temps, on="Prestation", how="outer", suffixes=("_tech", "_comp")).fillna(0)
+        prof.lap(title)
+
+def _mean_times(agents) -> pd.DataFrame:
+    """Return the mean times per prestation over *agents*."""
+    out = {}
+    for col, name in TIMES.items():
+        s = matrix[f"{name}_sum"].loc[agents].sum()
+        n = matrix[f"{name}_n"].loc[agents].sum()
+        out[col] = s / n.where(n > 0)
+    return pd.DataFrame(out)[["Temps théorique", "Temps réalisé"]]
+
+
+if {"realise_sum", "theorique_sum", "Prestation"}.issubset(matrix.columns.levels[0]):
+    done = matrix["Prestation"].loc[[tech, *comp_agents]].sum() > 0
+    tmp = pd.concat([_mean_times([tech]).add_suffix("_tech"), _mean_times(comp_agents).add_suffix("_comp")], axis=1)
+    tmp = tmp[done.reindex(tmp.index, fill_value=False).to_numpy()].fillna(0).rename_axis("Prestation").reset_index()
     fig = px.bar(tmp, x="Prestation", y=["Temps théorique_tech", "Temps théorique_comp", "Temps réalisé_tech", "Temps réalisé_comp"], barmode="group", color_discrete_sequence=ENEDIS_COLORS[:4], title="Temps théorique vs réalisé (comparé)")
     st.plotly_chart(fig, use_container_width=True)
+    prof.lap("Temps théorique vs réalisé (comparé)")
 
-gj = get_geojson()
-if "Arr" in interventions_tech.columns and gj:
-    arr_t = interventions_tech["Arr"].value_counts().rename_axis("Arr").reset_index(name="tech")
-    arr_c = interventions_comp["Arr"].value_counts().rename_axis("Arr").reset_index(name="comp")
-    arr = pd.merge(arr_t, arr_c, on="Arr", how="outer").fillna(0)
+base_map = get_base_map()
+if "Arr" in matrix.columns and base_map:
+    arr = pd.DataFrame({"tech": matrix["Arr"].loc[tech], "comp": matrix["Arr"].loc[comp_agents].sum()})
+    arr = arr[(arr["tech"] + arr["comp"]) > 0].rename_axis("Arr").reset_index()
     arr["pct_tech"] = arr["tech"] / arr["tech"].sum() * 100
     arr["pct_comp"] = arr["comp"] / arr["comp"].sum() * 100
     col_t, col_c = st.columns(2)
-    fig = px.choropleth(
-        arr,
-        geojson=gj,
-        locations="Arr",
-        color="pct_tech",
-        color_continuous_scale=[[0, "#E6F0FF"], [1, "#2C75FF"]],
-        featureidkey="properties.c_ar",
-        hover_data={"pct_tech": ":.1f", "pct_comp": ":.1f"},
-        center={"lat": 48.8566, "lon": 2.3522},
-        title="Interventions par arrondissement – technicien",
-    )
-    fig.update_geos(fitbounds="locations", visible=False)
+    hover = "Arr %{location}<br>technicien : %{customdata[0]:.1f}%<br>comparaison : %{customdata[1]:.1f}%"
+    locations, shares = arr["Arr"].astype(int), arr[["pct_tech", "pct_comp"]]
+    fig = choropleth(base_map, locations, arr["pct_tech"], shares, hover, "Interventions par arrondissement – technicien")
     col_t.plotly_chart(fig, use_container_width=True)
 
-    fig_c = px.choropleth(
-        arr,
-        geojson=gj,
-        locations="Arr",
-        color="pct_comp",
-        color_continuous_scale=[[0, "#E6F0FF"], [1, "#75C700"]],
-        featureidkey="properties.c_ar",
-        hover_data={"pct_tech": ":.1f", "pct_comp": ":.1f"},
-        center={"lat": 48.8566, "lon": 2.3522},
-        title="Interventions par arrondissement – comparaison",
-    )
-    fig_c.update_geos(fitbounds="locations", visible=False)
+    fig_c = choropleth(base_map, locations, arr["pct_comp"], shares, hover, "Interventions par arrondissement – comparaison", GREEN)
     col_c.plotly_chart(fig_c, use_container_width=True)
+    prof.lap("Cartes")
 
-st.dataframe(interventions_tech)
+paged_table(interventions_tech, key="tech")
+export_button(interventions_tech, name=f"interventions_{tech}")
+prof.lap("Tableau")
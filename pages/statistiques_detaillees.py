@@ -1,5 +1,9 @@
-import streamlit as st, pandas as pd, numpy as np, plotly.express as px
-from app_utils import get_geojson, build_interventions
+import streamlit as st, pandas as pd
+from app_utils import cached, get_base_map, get_commune_map, get_commune_table, get_index, get_interventions, get_rows, get_selection_cube, get_store, date_bounds, export_button, missing_communes, paged_table, profiler, value_counts
+from engine import counts, daily_counts, resample_counts, rollup
+import figures
+from maps import commune_counts
+from store import scope_of
 
 
 def _params(*args):
@@ -7,10 +11,10 @@ def _params(*args):
     return tuple(args)
 
 
-@st.cache_data(show_spinner=False)
-def _value_counts(flt: pd.DataFrame, column: str, params: tuple, n: int | None = None, sort: bool = False) -> pd.DataFrame:
-    """Return value counts for *column* with optional top-n filtering."""
-    vc = flt[column].value_counts()
+@cached
+def _value_counts(flt: pd.DataFrame, column: str, params: tuple, n: int | None = None, sort: bool = False, stored: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Return value counts for *column* with optional top-n filtering, from the *stored* counts if given."""
+    vc = stored.set_index(column)["n"] if stored is not None else value_counts(flt[column])
     if sort:
         vc = vc.sort_index()
     if n is not None:
@@ -18,80 +22,98 @@ def _value_counts(flt: pd.DataFrame, column: str, params: tuple, n: int | None =
     return vc.rename_axis(column).reset_index(name="Interventions")
 
 
-@st.cache_data(show_spinner=False)
-def _monthly_counts(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
+@cached
+def _cube_counts(cube: dict, column: str, params: tuple, n: int | None = None, sort: bool = False) -> pd.DataFrame:
+    """Return the cube counts for *column*, shaped like :func:`_value_counts`."""
+    vc = rollup(cube, column).set_index(column)["n"]
+    vc = vc.sort_index() if sort else vc.sort_values(ascending=False)
+    if n is not None:
+        vc = vc.nlargest(n)
+    return vc.rename_axis(column).reset_index(name="Interventions")
+
+
+@cached
+def _monthly_counts(cube: dict, params: tuple) -> pd.DataFrame:
     """Return counts by year and month."""
-    return flt.groupby(["Année", "Mois_nom"]).size().reset_index(name="Interventions")
+    return rollup(cube, ["Année", "Mois_nom"])[["Année", "Mois_nom", "n"]].rename(columns={"n": "Interventions"})
 
 
-@st.cache_data(show_spinner=False)
-def _date_prog_counts(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
-    """Return volume of programmations per day."""
-    dt = pd.to_datetime(flt["Date de programmation"], errors="coerce")
-    t = dt.dt.date.value_counts().sort_index().reset_index()
-    t.columns = ["Date", "Interventions"]
-    return t
+@cached
+def _date_prog_counts(flt: pd.DataFrame, params: tuple, stored: pd.DataFrame | None = None) -> tuple[pd.DataFrame, str]:
+    """Return volume of programmations per day, week or month, and the unit used."""
+    t, unit = resample_counts(stored if stored is not None else daily_counts(flt["Date de programmation"]))
+    return t.rename(columns={"n": "Interventions"}), unit
 
 
-@st.cache_data(show_spinner=False)
-def _temps_moyens(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
+@cached
+def _temps_moyens(cube: dict, params: tuple) -> pd.DataFrame:
     """Return mean theoretical and realised times by prestation."""
-    return flt.groupby("Prestation")[["Temps théorique", "Temps réalisé"]].mean().reset_index()
+    return rollup(cube, "Prestation")[["Prestation", "Temps théorique", "Temps réalisé"]]
 
 
-@st.cache_data(show_spinner=False)
-def _arr_counts(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
+@cached
+def _arr_counts(cube: dict, params: tuple) -> pd.DataFrame:
     """Return interventions count by arrondissement with percentages."""
-    arr = flt["Arr"].value_counts().rename_axis("Arr").reset_index(name="n")
+    arr = rollup(cube, "Arr")[["Arr", "n"]]
     arr["Arr"] = arr["Arr"].astype(int)
     arr["pct"] = arr["n"] / arr["n"].sum() * 100
     return arr
 
 
-@st.cache_data(show_spinner=False)
-def _top_prm(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
-    """Return top 10 PRM after cleaning the column."""
-    prm = flt["PRM"].dropna().apply(lambda x: str(x).split(".")[0])
-    top = prm.value_counts().nlargest(10).reset_index()
+@cached
+def _commune_counts(flt: pd.DataFrame, params: tuple, stored: pd.DataFrame | None = None) -> tuple[pd.DataFrame, int]:
+    """Return interventions count by commune code with percentages, and the unplaced count."""
+    vc = stored.set_index("Commune")["n"] if stored is not None else counts(flt["Commune"])
+    com, hors_zone = commune_counts(vc, get_commune_table())
+    com["pct"] = com["n"] / com["n"].sum() * 100
+    return com, hors_zone
+
+
+@cached
+def _top_prm(flt: pd.DataFrame, params: tuple, stored: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Return top 10 PRM."""
+    vc = stored.set_index("PRM_clean")["n"] if stored is not None else value_counts(flt["PRM_clean"])
+    top = vc.nlargest(10).reset_index()
     top.columns = ["PRM", "Interventions"]
     top["Rang"] = [f"{i+1}ᵉ" for i in range(len(top))]
     return top
 
 
-@st.cache_data(show_spinner=False)
-def _uo_top(flt: pd.DataFrame, params: tuple) -> pd.DataFrame:
+@cached
+def _uo_top(cube: dict, params: tuple) -> pd.DataFrame:
     """Return top 10 UO counts."""
     return (
-        flt["Code et libelle Uo"]
-        .value_counts()
-        .nlargest(10)
-        .rename_axis("UO")
-        .reset_index(name="Interventions")
+        rollup(cube, "Code et libelle Uo")
+        .nlargest(10, "n")[["Code et libelle Uo", "n"]]
+        .rename(columns={"Code et libelle Uo": "UO", "n": "Interventions"})
     )
 
 
-ENEDIS_COLORS = ["#2C75FF", "#75C700", "#4A9BFF", "#A0D87C", "#0072F0", "#47B361", "#6EABFF", "#9EE08E"]
-
 st.set_page_config(page_title="Détail par technicien", layout="wide")
+prof = profiler("statistiques_detaillees")
 
 if "data" not in st.session_state:
     st.warning("Merci de d'abord charger un fichier via la page principale.")
     st.stop()
 
 df = st.session_state["data"]
+index = get_index(st.session_state["data_key"], df)
 
-years = sorted(df["Année"].unique())
+years = index.values("Année")
 months = list(range(1, 13))
 days = list(range(1, 32))
-agences = sorted(df["Agence"].dropna().unique()) if "Agence" in df.columns else []
-prestations = sorted(df["Prestation"].dropna().unique()) if "Prestation" in df.columns else []
-uos = sorted(df["Code et libelle Uo"].dropna().unique()) if "Code et libelle Uo" in df.columns else []
-statuts = sorted(df["Statut de l'intervention"].dropna().unique()) if "Statut de l'intervention" in df.columns else []
-etats = sorted(df["Etat de réalisation"].dropna().unique()) if "Etat de réalisation" in df.columns else []
-techs = sorted(df["Agent"].dropna().unique()) if "Agent" in df.columns else []
+agences = index.values("Agence")
+prestations = index.values("Prestation")
+uos = index.values("Code et libelle Uo")
+statuts = index.values("Statut de l'intervention")
+etats = index.values("Etat de réalisation")
+techs = index.values("Agent")
+
+period = index.date_range
 
 with st.sidebar.form("filtres_detail"):
     tech = st.selectbox("Technicien", techs)
+    per = st.date_input("Période", value=period, min_value=period[0], max_value=period[1])
     y = st.multiselect("Années", years, years)
     m = st.multiselect("Mois", months, months, format_func=lambda x: f"{x:02d}")
     d = st.multiselect("Jours", days, days, format_func=lambda x: f"{x:02d}")
@@ -101,37 +123,42 @@ with st.sidebar.form("filtres_detail"):
     st_sel = st.multiselect("Statut", statuts, statuts)
     et_sel = st.multiselect("État", etats, etats)
     ok = st.form_submit_button("Appliquer")
+prof.lap("Barre latérale")
 
 if not ok:
     st.stop()
 
-flt = df[
-    df["Année"].isin(y)
-    & df["Mois"].isin(m)
-    & df["Jour"].isin(d)
-    & df["Agent"].eq(tech)
-]
-
-if prestations:
-    flt = flt[flt["Prestation"].isin(pr)]
-if uos:
-    flt = flt[flt["Code et libelle Uo"].isin(uo_sel)]
-if statuts:
-    flt = flt[flt["Statut de l'intervention"].isin(st_sel)]
-if etats:
-    flt = flt[flt["Etat de réalisation"].isin(et_sel)]
-if agences:
-    flt = flt[flt["Agence"].isin(agc_sel)]
-
-if flt.empty:
+start, end = date_bounds(per)
+selection = {
+    "Année": y,
+    "Mois": m,
+    "Jour": d,
+    "Agent": [tech],
+    "Prestation": pr if prestations else None,
+    "Code et libelle Uo": uo_sel if uos else None,
+    "Statut de l'intervention": st_sel if statuts else None,
+    "Etat de réalisation": et_sel if etats else None,
+    "Agence": agc_sel if agences else None,
+}
+params = (start, end, selection)
+if not len(get_rows(df, params)):
     st.warning("Aucune donnée pour ce technicien.")
     st.stop()
+prof.lap("Filtres")
 
-interventions = build_interventions(flt)
+interventions = get_interventions(df, params)
+prof.lap("build_interventions")
 if interventions.empty:
     st.warning("Aucune intervention selon les critères définis.")
     st.stop()
 
+cube = get_selection_cube(interventions, params)
+# Counts that would scan the rows are read from the precomputed store when
+# only the technician is filtered.
+store = get_store(st.session_state["data_key"])
+stored = (store.summary("agent", tech) if store is not None and scope_of(index, selection, start, end) == ("agent", tech) else None) or {}
+prof.lap("Cube")
+
 st.title(f"Statistiques détaillées – {tech}")
 
 c1, c2, c3, c4 = st.columns(4)
@@ -144,271 +171,164 @@ if "Temps réalisé" in interventions.columns:
     c4.metric("Durée min", f"{pos.min():.1f}")
 
 if "Année" in interventions.columns:
-    va = _value_counts(
-        interventions,
+    va = _cube_counts(
+        cube,
         "Année",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
         sort=True,
     )
-    fig = px.bar(
-        va,
-        x="Année",
-        y="Interventions",
-        color="Année",
-        color_discrete_sequence=ENEDIS_COLORS,
-        title="Volume annuel",
-    )
-    fig.update_traces(text=va["Interventions"], textposition="outside",
-                      hovertemplate="Année %{x}<br>%{y} interventions")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.annual_volume(va), use_container_width=True)
+    prof.lap("Volume annuel")
 
 if {"Année", "Mois_nom"}.issubset(interventions.columns):
     vm = _monthly_counts(
-        interventions,
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
-    )
-    fig = px.bar(
-        vm,
-        x="Mois_nom",
-        y="Interventions",
-        color="Année",
-        color_discrete_sequence=ENEDIS_COLORS,
-        barmode="group",
-        title="Volume mensuel",
+        cube,
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.monthly_volume(vm), use_container_width=True)
+    prof.lap("Volume mensuel")
 
 
 
 
 
 if "Prestation" in interventions.columns:
-    t = _value_counts(
-        interventions,
+    t = _cube_counts(
+        cube,
         "Prestation",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    t["%"] = (t["Interventions"] / t["Interventions"].sum() * 100).round(1)
-    fig = px.pie(
-        t,
-        names="Prestation",
-        values="Interventions",
-        hover_data=["%"],
-        title="Répartition prestations",
-        color_discrete_sequence=ENEDIS_COLORS
-    )
-    fig.update_traces(textinfo="percent+label", hovertemplate="%{label}<br>Interventions : %{value}<br>% : %{customdata[0]}")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.prestation_pie(t), use_container_width=True)
+    prof.lap("Répartition prestations")
 
 if "Statut de l'intervention" in interventions.columns:
-    statut_counts = _value_counts(
-        interventions,
+    statut_counts = _cube_counts(
+        cube,
         "Statut de l'intervention",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    total = statut_counts["Interventions"].sum()
-    statut_counts["%"] = (statut_counts["Interventions"] / total * 100).round(1)
-
-    fig = px.bar(
-        statut_counts,
-        x="Statut de l'intervention",
-        y="Interventions",
-        title="Répartition des statuts d'intervention",
-        color_discrete_sequence=ENEDIS_COLORS,
-        hover_data={"%": True, "Interventions": True}
-    )
-    fig.update_traces(hovertemplate="%{x}<br>Interventions : %{y}<br>% : %{customdata[0]}%")
-    fig.update_layout(xaxis_tickangle=-45)
+    fig = figures.share_bar(statut_counts, "Statut de l'intervention", "Répartition des statuts d'intervention")
     st.plotly_chart(fig, use_container_width=True)
+    prof.lap("Répartition des statuts d'intervention")
 
 if "Etat de réalisation" in interventions.columns:
-    et_counts = _value_counts(
-        interventions,
+    et_counts = _cube_counts(
+        cube,
         "Etat de réalisation",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
     # Rename column for shorter axis label
     et_counts = et_counts.rename(columns={"Etat de réalisation": "Etat"})
-    et_counts["%"] = (et_counts["Interventions"] / et_counts["Interventions"].sum() * 100).round(1)
-    fig = px.bar(
-        et_counts,
-        x="Etat",
-        y="Interventions",
-        title="Répartition des états de réalisation",
-        color_discrete_sequence=ENEDIS_COLORS,
-        hover_data={"%": True, "Interventions": True},
-    )
-    fig.update_traces(hovertemplate="%{x}<br>Interventions : %{y}<br>% : %{customdata[0]}%")
-    fig.update_layout(xaxis_tickangle=-45)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.share_bar(et_counts, "Etat", "Répartition des états de réalisation"), use_container_width=True)
+    prof.lap("Répartition des états de réalisation")
 
 
 if "Motif de non réalisation" in interventions.columns:
-    top_motifs = _value_counts(
-        interventions,
+    top_motifs = _cube_counts(
+        cube,
         "Motif de non réalisation",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
         n=10,
     )
-    total = top_motifs["Interventions"].sum()
-    top_motifs["%"] = (top_motifs["Interventions"] / total * 100).round(1)
-
-    fig = px.bar(
-        top_motifs,
-        x="Motif de non réalisation",
-        y="Interventions",
-        title="Top 10 motifs de non réalisation",
-        color_discrete_sequence=ENEDIS_COLORS,
-        hover_data={"%": True, "Interventions": True}
-    )
-    fig.update_traces(hovertemplate="%{x}<br>Interventions : %{y}<br>% : %{customdata[0]}%")
-    fig.update_layout(xaxis_tickangle=-45)
+    fig = figures.share_bar(top_motifs, "Motif de non réalisation", "Top 10 motifs de non réalisation")
     st.plotly_chart(fig, use_container_width=True)
+    prof.lap("Top 10 motifs de non réalisation")
 
 if "Code et libelle Uo" in interventions.columns:
-    fig = px.bar(
-        _uo_top(
-            interventions,
-            _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
-        ),
-        x="UO",
-        y="Interventions",
-        title="Top 10 UO",
-        color_discrete_sequence=ENEDIS_COLORS,
+    t = _uo_top(
+        cube,
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.count_bar(t, "UO", "Top 10 UO"), use_container_width=True)
+    prof.lap("Top 10 UO")
 
 if "Libelle du BI" in interventions.columns:
     t = _value_counts(
         interventions,
         "Libelle du BI",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
         n=10,
+        stored=stored.get("bi"),
     )
     t.columns = ["Libellé", "Interventions"]
-    t["%"] = (t["Interventions"] / t["Interventions"].sum() * 100).round(1)
-    fig = px.bar(
-        t,
-        x="Libellé",
-        y="Interventions",
-        text="%",
-        color="Libellé",
-        color_discrete_sequence=ENEDIS_COLORS,
-        title="Top 10 Libellé BI",
-    )
-    fig.update_traces(hovertemplate="%{x}<br>%{text}%")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.share_text_bar(t, "Libellé", "Top 10 Libellé BI"), use_container_width=True)
+    prof.lap("Top 10 Libellé BI")
 
-if "PRM" in interventions.columns:
+if "PRM_clean" in interventions.columns:
     top_prm = _top_prm(
         interventions,
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
-    )
-    fig = px.bar(
-        top_prm,
-        x="Rang",
-        y="Interventions",
-        color="PRM",
-        color_discrete_sequence=ENEDIS_COLORS,
-        text="Interventions",
-        title="Top 10 PRM (classés)",
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        stored=stored.get("prm"),
     )
-    fig.update_traces(textposition="outside",
-                      hovertemplate="Rang %{x}<br>%{y} interventions<br>PRM %{customdata}")
-    fig.update_layout(xaxis_title="Rang", yaxis_title="Nombre d’interventions")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.top_prm(top_prm), use_container_width=True)
+    prof.lap("Top 10 PRM (classés)")
 
 if "Origine" in interventions.columns:
-    t = _value_counts(
-        interventions,
+    t = _cube_counts(
+        cube,
         "Origine",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
-    )
-    t["%"] = (t["Interventions"] / t["Interventions"].sum() * 100).round(1)
-    fig = px.bar(
-        t,
-        x="Origine",
-        y="Interventions",
-        text="%",
-        color="Origine",
-        color_discrete_sequence=ENEDIS_COLORS,
-        title="Répartition par Origine",
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    fig.update_traces(hovertemplate="%{x}<br>%{text}%")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.share_text_bar(t, "Origine", "Répartition par Origine"), use_container_width=True)
+    prof.lap("Répartition par Origine")
 
 if "Date de programmation" in interventions.columns:
     try:
-        t = _date_prog_counts(
+        t, unit = _date_prog_counts(
             interventions,
-            _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
-        )
-        fig = px.bar(
-            t,
-            x="Date",
-            y="Interventions",
-            color_discrete_sequence=ENEDIS_COLORS,
-            title="Volume des programmations par jour",
+            _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+            stored=stored.get("programmation"),
         )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures.programmations(t, unit), use_container_width=True)
+        prof.lap("Programmations")
     except Exception:
         pass
 
 if {"Temps théorique", "Temps réalisé", "Prestation"}.issubset(interventions.columns):
     t = _temps_moyens(
-        interventions,
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        cube,
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    fig = px.bar(
-        t,
-        x="Prestation",
-        y=["Temps théorique", "Temps réalisé"],
-        color_discrete_sequence=ENEDIS_COLORS[:2],
-        barmode="group",
-        title="Temps théorique vs réalisé par prestation",
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.times_by_prestation(t), use_container_width=True)
+    prof.lap("Temps théorique vs réalisé par prestation")
 
 if "CDT" in interventions.columns:
     cdt_counts = _value_counts(
         interventions,
         "CDT",
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
-    )
-    fig = px.bar(
-        cdt_counts,
-        x="CDT",
-        y="Interventions",
-        title="Interventions par agent CDT",
-        color_discrete_sequence=ENEDIS_COLORS,
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures.count_bar(cdt_counts, "CDT", "Interventions par agent CDT"), use_container_width=True)
+    prof.lap("Interventions par agent CDT")
 
 
 
-gj = get_geojson()
+base_map = get_base_map()
 
-if "Arr" in interventions.columns and gj:
+if "Arr" in interventions.columns and base_map:
     arr = _arr_counts(
-        interventions,
-        _params(tech, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        cube,
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
     )
+    st.plotly_chart(figures.arr_map(base_map, arr), use_container_width=True)
+    prof.lap("Interventions par arrondissement (%)")
 
-    fig = px.choropleth(
-        arr,
-        geojson=gj,
-        locations="Arr",
-        color="pct",
-        color_continuous_scale=[[0, "#E6F0FF"], [1, "#2C75FF"]],
-        featureidkey="properties.c_ar",  
-        hover_data={"pct": ":.1f"},
-        center={"lat": 48.8566, "lon": 2.3522},
-        title="Interventions par arrondissement (%)"
-    )
+commune_map = get_commune_map()
 
-    fig.update_geos(fitbounds="locations", visible=False)
-    fig.update_traces(hovertemplate="Arr %{location}<br>%{customdata[0]}%")
-    st.plotly_chart(fig, use_container_width=True)
+if "Commune" in interventions.columns and commune_map:
+    com, hors_zone = _commune_counts(
+        interventions,
+        _params(tech, start, end, y, m, d, agc_sel, pr, uo_sel, st_sel, et_sel),
+        stored=stored.get("commune"),
+    )
+    st.plotly_chart(figures.commune_map(commune_map, com), use_container_width=True)
+    prof.lap("Interventions par commune (%)")
+    if hors_zone:
+        st.caption(f"{hors_zone} interventions dans des communes non cartographiées.")
+    if missing_communes():
+        st.caption("Contours des communes indisponibles : seule la carte de Paris est affichée.")
 
 
-st.dataframe(interventions)
+paged_table(interventions, key="interventions")
+export_button(interventions, name=f"interventions_{tech}")
+prof.lap("Tableau")
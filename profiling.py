@@ -0,0 +1,103 @@
+"""Per-stage timing of the page runs, independent from Streamlit."""
+
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import plotly.graph_objects as go
+
+
+def rss() -> int | None:
+    """Return the resident memory of the process in bytes, or ``None`` if unknown.
+
+    ``psutil`` is used when it is installed, ``/proc`` otherwise.
+    """
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Profiler:
+    """Lap timer recording the stages of one run of a page.
+
+    Each call to :meth:`lap` closes the stage that started at the previous
+    lap: its record holds the start offset and duration in seconds and the
+    change of resident memory in MiB. Records are appended to the JSONL file
+    *log* as they are taken, so runs interrupted by ``st.stop`` are kept, and
+    *on_lap* is called with the profiler, outside of the measured time. A
+    disabled profiler ignores laps.
+    """
+
+    def __init__(self, page: str, session: str | None = None, log=None, on_lap=None, enabled: bool = True):
+        self.page = page
+        self.session = session
+        self.log = Path(log) if log else None
+        self.on_lap = on_lap
+        self.enabled = enabled
+        self.run = uuid.uuid4().hex[:12]
+        self.records: list[dict] = []
+        self._t0 = self._last = time.perf_counter()
+        self._mem = rss() if enabled else None
+
+    def lap(self, stage: str) -> None:
+        """Record the time and memory spent since the previous lap under *stage*."""
+        if not self.enabled:
+            return
+        now, mem = time.perf_counter(), rss()
+        self.records.append({
+            "time": time.time(),
+            "session": self.session,
+            "run": self.run,
+            "page": self.page,
+            "stage": stage,
+            "start": round(self._last - self._t0, 6),
+            "seconds": round(now - self._last, 6),
+            "mem_delta_mb": None if mem is None or self._mem is None else round((mem - self._mem) / 2**20, 3),
+            "rss_mb": None if mem is None else round(mem / 2**20, 3),
+        })
+        if self.log is not None:
+            try:
+                self.log.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(self.records[-1], ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+        if self.on_lap is not None:
+            self.on_lap(self)
+        self._last, self._mem = time.perf_counter(), rss()
+
+    @property
+    def total(self) -> float:
+        """Return the seconds covered by the recorded stages."""
+        return sum(r["seconds"] for r in self.records)
+
+
+def waterfall(records: list[dict]) -> go.Figure:
+    """Return a horizontal waterfall of *records*, one bar per stage from its start offset."""
+    fig = go.Figure(go.Bar(
+        y=[r["stage"] for r in records],
+        x=[r["seconds"] for r in records],
+        base=[r["start"] for r in records],
+        orientation="h",
+        marker_color="#2C75FF",
+        customdata=[["" if r["mem_delta_mb"] is None else f"{r['mem_delta_mb']:+.1f} Mo"] for r in records],
+        hovertemplate="%{y}<br>%{x:.3f} s<br>%{customdata[0]}<extra></extra>",
+    ))
+    fig.update_yaxes(autorange="reversed")
+    fig.update_layout(
+        height=120 + 22 * len(records),
+        margin={"l": 0, "r": 0, "t": 10, "b": 0},
+        xaxis_title="s",
+        showlegend=False,
+    )
+    return fig
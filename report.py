@@ -0,0 +1,258 @@
+"""Static HTML reports of the detail page for every technician.
+
+Usage: ``python report.py export1.xlsx [...] [--month 2024-05] [--agents "A B" ...] [--workers N]``
+
+Each report holds the charts of the detailed statistics page for one agent
+over the period, built from the aggregated counts only: the interventions
+themselves are not embedded. The dataset is loaded once and the agents are
+rendered in worker processes sharing it.
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+from plotly.offline.offline import get_plotlyjs_version
+
+from engine import (
+    BitmapIndex, build_cube, build_interventions, counts, partition, resample_counts, summarize,
+)
+import figures
+from ingest import ROOT, load_files
+from maps import (
+    DEPARTEMENTS, GEO, commune_counts, commune_geojson, commune_table,
+    communes_path, simplify_geojson,
+)
+
+REPORTS = ROOT / ".cache" / "reports"
+
+PAGE = """<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{script}
+<style>
+body {{ font-family: sans-serif; margin: 2em auto; max-width: 1200px; color: #1F2A44; }}
+.kpi {{ display: flex; gap: 3em; margin: 1.5em 0; }}
+.kpi div {{ font-size: 0.9em; }}
+.kpi b {{ display: block; font-size: 1.8em; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>{period}</p>
+<div class="kpi">{kpis}</div>
+{body}
+</body>
+</html>
+"""
+
+
+def read_maps() -> tuple[dict | None, dict | None, pd.DataFrame | None]:
+    """Return the simplified arrondissement and commune geometries and the commune table.
+
+    They are read from the GeoJSON files downloaded by the dashboard, and are
+    ``None`` when those files are missing.
+    """
+    try:
+        arr = json.loads(GEO.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        arr = None
+    deps = []
+    for dep in DEPARTEMENTS:
+        try:
+            deps.append(json.loads(communes_path(dep).read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            pass
+    gj = commune_geojson(arr, deps)
+    if not gj["features"]:
+        gj = None
+    return (
+        simplify_geojson(arr) if arr else None,
+        simplify_geojson(gj, key="code") if gj else None,
+        commune_table(gj) if gj else None,
+    )
+
+
+def _counts(t: pd.DataFrame, column: str, n: int | None = None, sort: bool = False) -> pd.DataFrame:
+    """Return the bundle counts *t* of *column* shaped as the detail page counts them."""
+    vc = t.set_index(column)["n"]
+    vc = vc.sort_index() if sort else vc.sort_values(ascending=False)
+    if n is not None:
+        vc = vc.nlargest(n)
+    return vc.rename_axis(column).reset_index(name="Interventions")
+
+
+def detail_figures(interventions: pd.DataFrame, cube: dict, arr_base=None, commune_base=None, communes=None) -> list[go.Figure]:
+    """Return the charts of the detail page for the interventions of one agent.
+
+    *cube* is the cube of the same interventions, see
+    :func:`engine.build_cube`; the maps are left out when *arr_base* or
+    *commune_base* is ``None``.
+    """
+    bundle = summarize(interventions, cube)
+    figs = []
+    if "annual" in bundle:
+        figs.append(figures.annual_volume(_counts(bundle["annual"], "Année", sort=True)))
+    if "monthly" in bundle:
+        figs.append(figures.monthly_volume(bundle["monthly"].rename(columns={"n": "Interventions"})))
+    if "prestation" in bundle:
+        figs.append(figures.prestation_pie(_counts(bundle["prestation"], "Prestation")))
+    if "statut" in bundle:
+        t = _counts(bundle["statut"], "Statut de l'intervention")
+        figs.append(figures.share_bar(t, "Statut de l'intervention", "Répartition des statuts d'intervention"))
+    if "etat" in bundle:
+        t = _counts(bundle["etat"], "Etat de réalisation").rename(columns={"Etat de réalisation": "Etat"})
+        figs.append(figures.share_bar(t, "Etat", "Répartition des états de réalisation"))
+    if "motif" in bundle:
+        t = _counts(bundle["motif"], "Motif de non réalisation", 10)
+        figs.append(figures.share_bar(t, "Motif de non réalisation", "Top 10 motifs de non réalisation"))
+    if "uo" in bundle:
+        t = _counts(bundle["uo"], "Code et libelle Uo", 10).rename(columns={"Code et libelle Uo": "UO"})
+        figs.append(figures.count_bar(t, "UO", "Top 10 UO"))
+    if "bi" in bundle:
+        t = _counts(bundle["bi"], "Libelle du BI", 10).rename(columns={"Libelle du BI": "Libellé"})
+        figs.append(figures.share_text_bar(t, "Libellé", "Top 10 Libellé BI"))
+    if "prm" in bundle:
+        top = _counts(bundle["prm"], "PRM_clean", 10).rename(columns={"PRM_clean": "PRM"})
+        top["Rang"] = [f"{i+1}ᵉ" for i in range(len(top))]
+        figs.append(figures.top_prm(top))
+    if "origine" in bundle:
+        figs.append(figures.share_text_bar(_counts(bundle["origine"], "Origine"), "Origine", "Répartition par Origine"))
+    if "programmation" in bundle and len(bundle["programmation"]):
+        t, unit = resample_counts(bundle["programmation"])
+        figs.append(figures.programmations(t.rename(columns={"n": "Interventions"}), unit))
+    if "prestation" in bundle and {"Temps théorique", "Temps réalisé"}.issubset(bundle["prestation"].columns):
+        figs.append(figures.times_by_prestation(bundle["prestation"].sort_values("Prestation")))
+    if "CDT" in interventions.columns:
+        figs.append(figures.count_bar(counts(interventions["CDT"]).reset_index(name="Interventions"), "CDT", "Interventions par agent CDT"))
+    if "arr" in bundle and arr_base is not None:
+        arr = bundle["arr"][["Arr", "n"]].astype({"Arr": int}).sort_values("Arr")
+        figs.append(figures.arr_map(arr_base, arr.assign(pct=arr["n"] / arr["n"].sum() * 100)))
+    if "commune" in bundle and commune_base is not None:
+        com, hors_zone = commune_counts(bundle["commune"].set_index("Commune")["n"], communes)
+        fig = figures.commune_map(commune_base, com.assign(pct=com["n"] / com["n"].sum() * 100))
+        if hors_zone:
+            fig.update_layout(title=f"{fig.layout.title.text}<br><sup>{hors_zone} interventions dans des communes non cartographiées</sup>")
+        figs.append(fig)
+    return figs
+
+
+def plotlyjs_tag(cdn: bool = False) -> str:
+    """Return the script tag of plotly.js, inline unless *cdn*."""
+    if cdn:
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+
+
+def render(tech: str, interventions: pd.DataFrame, figs: list[go.Figure], period: str, script: str) -> str:
+    """Return the HTML page of the report of *tech*, loading plotly.js with the tag *script*."""
+    kpis = {"Interventions": f"{len(interventions)}"}
+    if "Temps réalisé" in interventions.columns:
+        pos = interventions["Temps réalisé"][interventions["Temps réalisé"] > 0]
+        kpis.update({"Durée moy": f"{pos.mean():.1f}", "Durée max": f"{pos.max():.1f}", "Durée min": f"{pos.min():.1f}"})
+    return PAGE.format(
+        title=html.escape(f"Statistiques détaillées – {tech}"),
+        script=script,
+        period=html.escape(period),
+        kpis="".join(f"<div>{html.escape(k)}<b>{v}</b></div>" for k, v in kpis.items()),
+        body="\n".join(fig.to_html(full_html=False, include_plotlyjs=False, config={"displaylogo": False}) for fig in figs),
+    )
+
+
+def filename(tech) -> str:
+    """Return the report file name of the agent *tech*."""
+    return re.sub(r"[^\w-]+", "_", str(tech)).strip("_") + ".html"
+
+
+_frame = None
+_maps = (None, None, None)
+_options = {}
+
+
+def _init(df: pd.DataFrame, maps: tuple, options: dict) -> None:
+    global _frame, _maps, _options
+    _frame, _maps, _options = df, maps, options
+
+
+def _report(tech, rows: np.ndarray, dest: Path) -> int:
+    """Write the report of *tech* from the rows at *rows* and return its intervention count."""
+    interventions = build_interventions(_frame.take(rows))
+    if interventions.empty:
+        return 0
+    figs = detail_figures(interventions, build_cube(interventions), *_maps)
+    dest.write_text(render(tech, interventions, figs, _options["period"], _options["script"]), encoding="utf-8")
+    return len(interventions)
+
+
+def _period(start, end) -> str:
+    if start is None and end is None:
+        return "Toutes les dates"
+    fmt = "%d/%m/%Y"
+    if start is None:
+        return f"Jusqu'au {pd.Timestamp(end):{fmt}}"
+    if end is None:
+        return f"À partir du {pd.Timestamp(start):{fmt}}"
+    return f"Du {pd.Timestamp(start):{fmt}} au {pd.Timestamp(end):{fmt}}"
+
+
+def generate(df: pd.DataFrame, out: Path = REPORTS, agents=None, start=None, end=None,
+             workers: int | None = None, cdn: bool = False) -> dict:
+    """Write the report of every agent of *df*, or of *agents*, between *start* and *end*.
+
+    Returns the number of interventions of each written report by path;
+    agents without interventions over the period get no report.
+    """
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    rows = BitmapIndex(df).rows({"Agent": None if agents is None else list(agents)}, start, end)
+    tasks = [(tech, rows[part], out / filename(tech)) for tech, part in partition(df["Agent"].take(rows))]
+    options = {"start": start, "end": end, "period": _period(start, end), "script": plotlyjs_tag(cdn)}
+
+    workers = workers or os.cpu_count() or 1
+    ctx = get_context("fork") if "fork" in get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init,
+                             initargs=(df, read_maps(), options)) as ex:
+        futures = {dest: ex.submit(_report, tech, part, dest) for tech, part, dest in tasks}
+        written = {dest: fut.result() for dest, fut in futures.items()}
+    return {dest: n for dest, n in written.items() if n}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write the HTML report of the detailed statistics of every technician.")
+    parser.add_argument("files", nargs="+", type=Path, help="Excel exports, combined as on the main page")
+    parser.add_argument("--month", help="month of the reports, e.g. 2024-05")
+    parser.add_argument("--start", help="first day of the reports, e.g. 2024-05-01")
+    parser.add_argument("--end", help="last day of the reports, e.g. 2024-05-31")
+    parser.add_argument("--agents", nargs="+", help="agents to report on, all of them by default")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--out", type=Path, default=REPORTS)
+    parser.add_argument("--cdn", action="store_true", help="load plotly.js from its CDN instead of embedding it")
+    args = parser.parse_args(argv)
+
+    start, end = args.start, args.end
+    if args.month:
+        first = pd.Period(args.month, "M")
+        start, end = first.start_time.date(), first.end_time.date()
+    _, df = load_files(args.files, args.workers)
+    if df is None or df.empty:
+        raise SystemExit("Fichier non conforme")
+    written = generate(df, args.out, args.agents, start, end, args.workers, args.cdn)
+    for path, n in written.items():
+        print(f"{n:>7} {path}")
+    if not written:
+        raise SystemExit("Aucune intervention sur la période")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Aggregates precomputed outside of Streamlit and read back by the pages.
+
+Usage: ``python store.py export1.xlsx [export2.xlsx ...] [--workers N]``
+
+The command loads the exports as the main page does, then computes the
+dashboard summaries of the whole dataset, of every agent and of every
+agence, plus the fleet matrix and the leaderboard indicators, in a process
+pool. They are stored under ``.cache/store/<dataset key>`` and the pages
+use them whenever the sidebar selection covers a whole scope.
+"""
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    MATRIX_DIMS, BitmapIndex, agent_kpis, agent_matrix, build_cube, build_interventions,
+    month_ids, partition, summarize,
+)
+from ingest import ROOT, load_files
+
+STORE = ROOT / ".cache" / "store"
+# Bump whenever the stored aggregates change so that stale stores are ignored.
+STORE_VERSION = 3
+# Partial scopes of the store and the column selecting them.
+SCOPES = {"agent": "Agent", "agence": "Agence"}
+
+
+def scope_of(index: BitmapIndex, selection: dict, start=None, end=None) -> tuple[str, object] | None:
+    """Return the stored scope equivalent to a sidebar selection, if any.
+
+    That is ``("all", None)`` when nothing is filtered out, and
+    ``(scope, value)`` when only one value of a ``SCOPES`` column is kept.
+    """
+    constraints = index.constraints(selection, start, end)
+    if not constraints:
+        return "all", None
+    if len(constraints) == 1:
+        (col, selected), = constraints.items()
+        for scope, scope_col in SCOPES.items():
+            if col == scope_col and len(set(selected)) == 1:
+                return scope, next(iter(selected))
+    return None
+
+
+class Store:
+    """Read access to the aggregates stored for one dataset."""
+
+    def __init__(self, path: Path, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, key: str, root: Path = STORE) -> "Store | None":
+        """Return the store of the dataset *key*, or ``None`` if there is no usable one."""
+        path = Path(root) / key
+        try:
+            manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != STORE_VERSION or manifest.get("key") != key:
+            return None
+        return cls(path, manifest)
+
+    def _read(self, name: str | None):
+        if name is None:
+            return None
+        try:
+            return pd.read_pickle(self.path / name)
+        except (OSError, ValueError):
+            return None
+
+    def frame(self, name: str) -> pd.DataFrame | None:
+        """Return the dataset-wide frame *name* (``matrix`` or ``kpis``), if stored."""
+        return self._read(self.manifest["frames"].get(name))
+
+    def summary(self, scope: str, value=None) -> dict | None:
+        """Return the :func:`engine.summarize` bundle of *value* in *scope*, if stored."""
+        files = self.manifest["scopes"].get(scope, {})
+        return self._read(files.get("" if value is None else str(value)))
+
+
+_frame = None
+
+
+def _init(df: pd.DataFrame) -> None:
+    global _frame
+    _frame = df
+
+
+def _summarize(col: str | None, value, rows: np.ndarray, dest: Path) -> None:
+    """Write the bundle of the rows at *rows*, as the main page would compute it."""
+    interventions = build_interventions(_frame.take(rows))
+    pd.to_pickle(summarize(interventions, build_cube(interventions)), dest)
+
+
+def precompute(df: pd.DataFrame, key: str, root: Path = STORE, workers: int | None = None) -> Path:
+    """Compute and store every aggregate of the dataset *df* identified by *key*.
+
+    The summaries of each scope value are spread over worker processes,
+    forked where possible so the frame is not copied; the store replaces
+    any previous one of the same dataset once complete.
+    """
+    dest = Path(root) / key
+    tmp = dest.with_name(f"{key}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    interventions = build_interventions(df)
+    tasks = [(None, None, np.arange(len(df)), "all.pkl")]
+    manifest = {"version": STORE_VERSION, "key": key, "rows": len(df), "frames": {}, "scopes": {"all": {"": "all.pkl"}}}
+    for scope, col in SCOPES.items():
+        if col not in df.columns:
+            continue
+        (tmp / scope).mkdir()
+        files = manifest["scopes"][scope] = {}
+        for i, (value, rows) in enumerate(partition(df[col])):
+            files[str(value)] = f"{scope}/{i:05d}.pkl"
+            tasks.append((col, value, rows, files[str(value)]))
+
+    workers = workers or os.cpu_count() or 1
+    ctx = get_context("fork") if "fork" in get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init, initargs=(df,)) as ex:
+        futures = [ex.submit(_summarize, col, value, rows, tmp / name) for col, value, rows, name in tasks]
+        if "Agent" in interventions.columns:
+            fleet = interventions
+            if {"Année", "Mois"}.issubset(fleet.columns):
+                fleet = fleet.assign(Période=month_ids(fleet))
+            pd.to_pickle(agent_matrix(fleet, MATRIX_DIMS), tmp / "matrix.pkl")
+            pd.to_pickle(agent_kpis(interventions), tmp / "kpis.pkl")
+            manifest["frames"] = {"matrix": "matrix.pkl", "kpis": "kpis.pkl"}
+        for fut in futures:
+            fut.result()
+
+    (tmp / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    shutil.rmtree(dest, ignore_errors=True)
+    os.replace(tmp, dest)
+    return dest
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute the dashboard aggregates of interventions exports.")
+    parser.add_argument("files", nargs="+", type=Path, help="Excel exports, combined as on the main page")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--out", type=Path, default=STORE)
+    args = parser.parse_args(argv)
+    key, df = load_files(args.files, args.workers)
+    if df is None or df.empty:
+        raise SystemExit("Fichier non conforme")
+    print(precompute(df, key, args.out, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Synthetic interventions exports for benchmarks, independent from Streamlit.
+
+Usage: ``python synthetic.py 100k 1M --out .cache/bench --formats xlsx parquet``
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from export import XLSX_MAX_ROWS, write_export
+
+PRESTATIONS = (
+    "Mise en service", "Résiliation", "Changement de fournisseur", "Modification contractuelle",
+    "Relève spéciale", "Coupure pour impayé", "Rétablissement", "Intervention technique",
+)
+STATUTS = ("Terminée", "Annulée", "Planifiée", "En cours")
+ETATS = ("Réalisée", "Non réalisée", "Partiellement réalisée")
+MOTIFS = (
+    "Client absent", "Accès impossible", "Compteur inaccessible", "Refus client",
+    "Matériel manquant", "Conditions météo", "Erreur d'adresse", "Danger sur site",
+)
+ORIGINES = ("Client", "Fournisseur", "Distributeur", "Interne")
+PERIMETRES = (
+    "AISMA 75_PARIS_NORD", "AISMA 75_PARIS_SUD", "AISMA 75_PARIS_EST", "AISMA 75_PARIS_OUEST",
+    "AISMA 92_HAUTS_DE_SEINE", "AISMA 93_SEINE_SAINT_DENIS", "AISMA 94_VAL_DE_MARNE",
+)
+BANLIEUE = (
+    "BOULOGNE BILLANCOURT", "NANTERRE", "COURBEVOIE", "ISSY LES MOULINEAUX", "LEVALLOIS PERRET",
+    "NEUILLY SUR SEINE", "MONTREUIL", "SAINT DENIS", "AUBERVILLIERS", "PANTIN", "BOBIGNY",
+    "VINCENNES", "CRETEIL", "VITRY SUR SEINE", "IVRY SUR SEINE", "SAINT MAUR DES FOSSES",
+    "NANTERRE CEDEX", "CHAMPIGNY SUR MARNE",
+)
+COMMUNES = tuple(f"PARIS {i:02d}" for i in range(1, 21)) + BANLIEUE
+# Share of rows repeating the (PRM, day, agent, CDT) of another row, which
+# ``build_interventions`` removes.
+DUPLICATES = 0.02
+
+
+def parse_size(text: str) -> int:
+    """Return the row count written as ``10k``, ``1.5M`` or ``250000``."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def _pick(rng: np.random.Generator, labels, n: int, skew: float = 1.0) -> pd.Categorical:
+    """Draw *n* of *labels*, the first ones more often when *skew* is above 0."""
+    w = 1 / np.arange(1, len(labels) + 1) ** skew
+    return pd.Categorical.from_codes(rng.choice(len(labels), n, p=w / w.sum()), list(labels))
+
+
+def generate(rows: int, seed: int = 0, years: int = 3, end: str = "2024-12-31") -> pd.DataFrame:
+    """Return *rows* interventions shaped like a raw export, before ingestion.
+
+    Text columns are categoricals so that millions of rows stay cheap to
+    build; the volume of agents, PRM and UO grows with *rows* the way a
+    larger perimeter would. The rows are not sorted by date.
+    """
+    rng = np.random.default_rng(seed)
+    n_agents = int(np.clip(rows // 2_000, 20, 400))
+    n_cdt = max(n_agents // 8, 3)
+    n_prm = max(rows // 4, 10)
+
+    last = pd.Timestamp(end).normalize()
+    first = last - pd.DateOffset(years=years) + pd.Timedelta(days=1)
+    span = (last - first).days + 1
+    minutes = rng.integers(0, span, rows) * 1440 + rng.integers(7 * 60, 19 * 60, rows)
+    done = np.datetime64(first, "m") + minutes.astype("timedelta64[m]")
+
+    agent = rng.integers(0, n_agents, rows)
+    # Most PRM see a few visits, a tenth of the rows go to a few busy ones.
+    prm = rng.integers(0, n_prm, rows)
+    busy = rng.random(rows) < 0.1
+    prm[busy] = rng.zipf(2.0, busy.sum()) % n_prm
+    prm = 10**13 + prm * 7919 % 10**13
+    repeat = np.flatnonzero(rng.random(rows) < DUPLICATES)
+    if len(repeat):
+        src = rng.integers(0, rows, len(repeat))
+        agent[repeat], prm[repeat], done[repeat] = agent[src], prm[src], done[src]
+    planned = done.astype("datetime64[D]") - rng.integers(1, 45, rows).astype("timedelta64[D]")
+
+    etat = _pick(rng, ETATS, rows, skew=2.5)
+    motif = _pick(rng, MOTIFS, rows)
+    motif[np.asarray(etat) == "Réalisée"] = np.nan
+    theorique = rng.choice(np.arange(15, 135, 15), rows).astype(float)
+    realise = np.round(theorique * rng.lognormal(0, 0.35, rows))
+    realise[rng.random(rows) < 0.03] = np.nan
+
+    agents = np.array([f"TECH{i:04d} Prénom{i % 97}" for i in range(n_agents)], dtype=object)
+    cdts = np.array([f"CDT{i:03d}" for i in range(n_cdt)], dtype=object)
+    uos = [f"UO {7500 + i} - Unité {i}" for i in range(max(n_agents // 10, 6))]
+    bis = [f"BI {i:03d} - Opération {i}" for i in range(60)]
+    return pd.DataFrame({
+        "PRM": prm.astype(float),
+        "Prestation": _pick(rng, PRESTATIONS, rows),
+        "Perimètre géographique": pd.Categorical.from_codes(agent % len(PERIMETRES), list(PERIMETRES)),
+        "Libelle du BI": _pick(rng, bis, rows, skew=0.8),
+        "Commune": _pick(rng, COMMUNES, rows, skew=0.3),
+        "Code et libelle Uo": _pick(rng, uos, rows, skew=0.5),
+        "Origine": _pick(rng, ORIGINES, rows),
+        "Date de programmation": planned.astype("datetime64[ns]"),
+        "Date de réalisation": done.astype("datetime64[ns]"),
+        "Statut de l'intervention": _pick(rng, STATUTS, rows, skew=2),
+        "Etat de réalisation": etat,
+        "Motif de non réalisation": motif,
+        "Temps théorique": theorique,
+        "Temps réalisé": realise,
+        "Agent programmé": pd.Categorical(agents[agent]),
+        "CDT": pd.Categorical(cdts[agent % n_cdt]),
+        "Commentaire du technicien": _pick(rng, ("RAS", "Client prévenu", "Voir BI", "12"), rows),
+    })
+
+
+def write(df: pd.DataFrame, dest: Path, formats=("xlsx", "parquet")) -> list[Path]:
+    """Write *df* as ``<dest>.parquet`` and as one or more ``.xlsx`` exports.
+
+    A sheet holds at most ``XLSX_MAX_ROWS`` rows, so larger frames are split
+    into ``<dest>_partN.xlsx`` files, as several monthly exports would be.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    paths = []
+    if "parquet" in formats:
+        paths.append(dest.with_suffix(".parquet"))
+        with open(paths[-1], "wb") as f:
+            write_export(df, "Parquet", f)
+    if "xlsx" in formats:
+        parts = range(0, max(len(df), 1), XLSX_MAX_ROWS)
+        for i, lo in enumerate(parts):
+            paths.append(dest.with_suffix(".xlsx") if len(parts) == 1 else dest.with_name(f"{dest.name}_part{i + 1}.xlsx"))
+            with open(paths[-1], "wb") as f:
+                write_export(df.iloc[lo:lo + XLSX_MAX_ROWS], "Excel", f)
+    return paths
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic interventions exports.")
+    parser.add_argument("sizes", nargs="+", help="row counts, e.g. 10k 1M 5M")
+    parser.add_argument("--out", type=Path, default=Path(".cache") / "bench")
+    parser.add_argument("--formats", nargs="+", default=["xlsx", "parquet"], choices=["xlsx", "parquet"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for size in args.sizes:
+        rows = parse_size(size)
+        for path in write(generate(rows, args.seed), args.out / f"synthetic_{rows}_{args.seed}", args.formats):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()